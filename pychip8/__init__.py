@@ -0,0 +1,5 @@
+from .framebuffer import Framebuffer
+from .jit import BlockCache
+from .machine import Chip8
+
+__all__ = ["BlockCache", "Chip8", "Framebuffer"]
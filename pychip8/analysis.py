@@ -0,0 +1,414 @@
+"""
+Static analysis of a ROM: reachable code, data, a disassembly and a
+control-flow graph.
+
+    python -m pychip8.analysis ROM [--dot cfg.dot] [--platform schip]
+
+Code is found by recursive descent from 0x200, following jumps, calls,
+both ways out of every skip, and the base address of Bnnn (the rest of a
+jump table is reached at run time only). Bytes never reached are data;
+data that an Annn points at is taken to be sprites. Results are cached as
+JSON under the ROM's SHA-1 and platform, so engines can cheaply
+`predecode()` the code of a ROM they have seen before.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+from .decode import decode, opcode_pattern
+from .machine import PROGRAM_START, Chip8, memory_size
+from .quirks import PLATFORMS, PROFILES
+
+ANALYSIS_VERSION = 2
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "pychip8"
+)
+
+_descriptions = {}
+# The first profile of each platform, to decode handlers with.
+_platform_profiles = {}
+for _quirks in PROFILES.values():
+    _platform_profiles.setdefault(_quirks.platform, _quirks)
+
+
+def describe(opcode, platform="chip8"):
+    """The FUNCTION line of the docstring of the handler for `opcode` on `platform`."""
+    pattern = platform, opcode_pattern(opcode, platform)
+    if pattern not in _descriptions:
+        machine = Chip8(quirks=_platform_profiles[platform])
+        lines = [line.strip() for line in (decode(machine, opcode).__doc__ or "").splitlines()]
+        lines = [line for line in lines if line]
+        text = lines[0] if lines else ""
+        for line in lines:
+            # One docstring spells it FUNTION.
+            if line.startswith(("FUNCTION:", "FUNTION:")):
+                text = line.split(":", 1)[1].strip()
+                break
+        _descriptions[pattern] = text
+    return _descriptions[pattern]
+
+
+def width(opcode, platform="chip8"):
+    """Bytes taken by the instruction: 4 for XO-CHIP's F000 nnnn, else 2."""
+    return 4 if platform == "xochip" and opcode == 0xF000 else 2
+
+
+def mnemonic(opcode, platform="chip8"):
+    """Assembly for `opcode` in the usual CHIP-8 notation, e.g. "ADD V1, V2"."""
+    x = (opcode & 0x0F00) >> 8
+    y = (opcode & 0x00F0) >> 4
+    n = opcode & 0x000F
+    nn = opcode & 0x00FF
+    nnn = opcode & 0x0FFF
+    group = opcode >> 12
+    if platform != "chip8":
+        extended = _extended_mnemonic(opcode, platform, x, y, n, nn)
+        if extended:
+            return extended
+    if opcode == 0x00E0:
+        return "CLS"
+    if opcode == 0x00EE:
+        return "RET"
+    if group == 0x0:
+        return "SYS #%03X" % nnn
+    if group == 0x1:
+        return "JP #%03X" % nnn
+    if group == 0x2:
+        return "CALL #%03X" % nnn
+    if group == 0x3:
+        return "SE V%X, #%02X" % (x, nn)
+    if group == 0x4:
+        return "SNE V%X, #%02X" % (x, nn)
+    if group == 0x5:
+        return "SE V%X, V%X" % (x, y)
+    if group == 0x6:
+        return "LD V%X, #%02X" % (x, nn)
+    if group == 0x7:
+        return "ADD V%X, #%02X" % (x, nn)
+    if group == 0x8:
+        name = {0x0: "LD", 0x1: "OR", 0x2: "AND", 0x3: "XOR", 0x4: "ADD", 0x5: "SUB", 0x7: "SUBN"}.get(n)
+        if name:
+            return "%s V%X, V%X" % (name, x, y)
+        if n in (0x6, 0xE):
+            return "%s V%X" % ("SHR" if n == 0x6 else "SHL", x)
+    elif group == 0x9:
+        return "SNE V%X, V%X" % (x, y)
+    elif group == 0xA:
+        return "LD I, #%03X" % nnn
+    elif group == 0xB:
+        return "JP V%X, #%03X" % (x, nnn)
+    elif group == 0xC:
+        return "RND V%X, #%02X" % (x, nn)
+    elif group == 0xD:
+        return "DRW V%X, V%X, %d" % (x, y, n)
+    elif group == 0xE:
+        if nn in (0x9E, 0xA1):
+            return "%s V%X" % ("SKP" if nn == 0x9E else "SKNP", x)
+    else:
+        form = {
+            0x07: "LD V%X, DT",
+            0x0A: "LD V%X, K",
+            0x15: "LD DT, V%X",
+            0x18: "LD ST, V%X",
+            0x1E: "ADD I, V%X",
+            0x29: "LD F, V%X",
+            0x33: "LD B, V%X",
+            0x55: "LD [I], V%X",
+            0x65: "LD V%X, [I]",
+        }.get(nn)
+        if form:
+            return form % x
+    return "DW #%04X" % opcode
+
+
+def _extended_mnemonic(opcode, platform, x, y, n, nn):
+    """SCHIP and XO-CHIP assembly for `opcode`, or None if it is plain CHIP-8."""
+    pattern = opcode_pattern(opcode, platform)
+    if pattern == "00Cn":
+        return "SCD %d" % n
+    if pattern == "00Dn":
+        return "SCU %d" % n
+    if pattern == "Dxy0":
+        return "DRW V%X, V%X, 0" % (x, y)
+    if pattern in ("5xy2", "5xy3"):
+        return "%s V%X - V%X" % ("SAVE" if pattern == "5xy2" else "LOAD", x, y)
+    if pattern == "Fn01":
+        return "PLANE %d" % x
+    form = {
+        "00FB": "SCR",
+        "00FC": "SCL",
+        "00FD": "EXIT",
+        "00FE": "LOW",
+        "00FF": "HIGH",
+        "F000": "LD I, LONG",
+        "F002": "AUDIO",
+        "Fx30": "LD HF, V%X",
+        "Fx3A": "PITCH V%X",
+        "Fx75": "LD R, V%X",
+        "Fx85": "LD V%X, R",
+    }.get(pattern)
+    return form % x if form and "%" in form else form
+
+
+def successors(opcode, address, platform="chip8", memory=None):
+    """
+    [(target, kind)] for control leaving the instruction at `address`. On
+    XO-CHIP a skip over F000 nnnn skips four bytes, which takes `memory`.
+    """
+    group = opcode >> 12
+    nnn = opcode & 0x0FFF
+    following = address + 2
+    skipped = following + 2
+    if platform == "xochip" and memory is not None and memory[following : following + 2] == b"\xf0\x00":
+        skipped += 2
+    if opcode == 0x00EE:
+        return []
+    if platform != "chip8" and opcode == 0x00FD:
+        return []
+    if group == 0x1:
+        return [(nnn, "jump")]
+    if group == 0x2:
+        return [(nnn, "call"), (following, "return")]
+    if group == 0xB:
+        return [(nnn, "indirect")]
+    if group in (0x3, 0x4) or (group in (0x5, 0x9) and not opcode & 0x000F):
+        return [(following, "next"), (skipped, "skip")]
+    if group == 0xE and opcode & 0x00FF in (0x9E, 0xA1):
+        return [(following, "next"), (skipped, "skip")]
+    return [(address + width(opcode, platform), "next")]
+
+
+class Analysis:
+    """
+    The result of analysing one ROM.
+
+    `code` maps the address of every reachable instruction to its opcode;
+    `blocks` maps each basic block's start to (end, [(target, kind)]);
+    `calls` holds subroutine entry points and `sprites` the data addresses
+    loaded into I. Everything is plain data so it round-trips through JSON.
+    """
+
+    def __init__(self, sha1, size, code, blocks, calls, sprites, platform="chip8"):
+        self.sha1 = sha1
+        self.size = size
+        self.code = code
+        self.blocks = blocks
+        self.calls = calls
+        self.sprites = sprites
+        self.platform = platform
+
+    @classmethod
+    def of(cls, rom, platform="chip8"):
+        memory = bytearray(memory_size(platform))
+        memory[PROGRAM_START : PROGRAM_START + len(rom)] = rom
+        end = PROGRAM_START + len(rom)
+        code = {}
+        edges = {}
+        calls = set()
+        targets = {PROGRAM_START}
+        pending = [PROGRAM_START]
+        while pending:
+            address = pending.pop()
+            while PROGRAM_START <= address < end - 1 and address not in code:
+                opcode = (memory[address] << 8) | memory[address + 1]
+                code[address] = opcode
+                leaving = successors(opcode, address, platform, memory)
+                edges[address] = leaving
+                for target, kind in leaving:
+                    if kind == "call":
+                        calls.add(target)
+                    if kind != "next":
+                        targets.add(target)
+                        pending.append(target)
+                if len(leaving) != 1 or leaving[0][1] != "next":
+                    # A skip's fall-through is code too.
+                    pending.extend(target for target, kind in leaving if kind == "next")
+                    break
+                address = leaving[0][0]
+        # A block starts at every target and after every instruction that
+        # can go somewhere other than the next one.
+        leaders = targets & set(code)
+        for address, leaving in edges.items():
+            if len(leaving) != 1 or leaving[0][1] != "next":
+                leaders.add(address + 2)
+        blocks = {}
+        for start in sorted(leaders & set(code)):
+            address = start
+            while True:
+                leaving = edges[address]
+                following = address + width(code[address], platform)
+                if len(leaving) != 1 or leaving[0][1] != "next" or following in leaders or following not in code:
+                    break
+                address = following
+            blocks[start] = (following, leaving)
+        sprites = sorted(
+            {opcode & 0x0FFF for opcode in code.values() if opcode >> 12 == 0xA}
+            - set(code)
+        )
+        return cls(
+            hashlib.sha1(rom).hexdigest(), len(rom), code, blocks, sorted(calls & set(code)), sprites, platform
+        )
+
+    def to_json(self):
+        return {
+            "version": ANALYSIS_VERSION,
+            "platform": self.platform,
+            "sha1": self.sha1,
+            "size": self.size,
+            "code": [[address, opcode] for address, opcode in sorted(self.code.items())],
+            "blocks": [
+                [start, end, [[target, kind] for target, kind in leaving]]
+                for start, (end, leaving) in sorted(self.blocks.items())
+            ],
+            "calls": self.calls,
+            "sprites": self.sprites,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        if data.get("version") != ANALYSIS_VERSION:
+            raise ValueError("unsupported analysis version %r" % data.get("version"))
+        return cls(
+            data["sha1"],
+            data["size"],
+            {address: opcode for address, opcode in data["code"]},
+            {start: (end, [tuple(edge) for edge in leaving]) for start, end, leaving in data["blocks"]},
+            data["calls"],
+            data["sprites"],
+            data["platform"],
+        )
+
+    def label(self, address):
+        if address in self.calls:
+            return "sub_%03x" % address
+        if address in self.blocks:
+            return "L_%03x" % address
+        if address in self.sprites:
+            return "spr_%03x" % address
+        return None
+
+    def disassembly(self, rom):
+        """Text listing of the whole ROM: instructions with their docstring text, then data."""
+        lines = []
+        end = PROGRAM_START + len(rom)
+        address = PROGRAM_START
+        in_sprite = False
+        while address < end:
+            label = self.label(address)
+            if label:
+                lines.append("%s:" % label)
+            if address in self.code:
+                opcode = self.code[address]
+                text = mnemonic(opcode, self.platform)
+                size = width(opcode, self.platform)
+                if size == 4:
+                    text = "LD I, #%s" % rom[address + 2 - PROGRAM_START : address + 4 - PROGRAM_START].hex().upper()
+                lines.append(
+                    "  %03x: %04x  %-16s ; %s" % (address, opcode, text, describe(opcode, self.platform))
+                )
+                address += size
+                in_sprite = False
+                continue
+            in_sprite = in_sprite or address in self.sprites
+            byte = rom[address - PROGRAM_START]
+            if in_sprite:
+                pixels = "".join("#" if byte & (0x80 >> bit) else "." for bit in range(8))
+                lines.append("  %03x: %02x    DB #%02X           ; %s" % (address, byte, byte, pixels))
+                address += 1
+                continue
+            run = address + 1
+            while run < end and run - address < 8 and run not in self.code and not self.label(run):
+                run += 1
+            chunk = rom[address - PROGRAM_START : run - PROGRAM_START]
+            lines.append("  %03x: DB %s" % (address, ", ".join("#%02X" % byte for byte in chunk)))
+            address = run
+        return "\n".join(lines) + "\n"
+
+    def dot(self):
+        """The control-flow graph in Graphviz dot format."""
+        lines = ['digraph "%s" {' % self.sha1, "  node [shape=box fontname=monospace];"]
+        for start, (end, leaving) in sorted(self.blocks.items()):
+            body = "\\l".join(
+                "%03x: %s" % (address, mnemonic(self.code[address], self.platform))
+                for address in range(start, end, 2)
+                if address in self.code
+            )
+            lines.append('  b%03x [label="%s\\l"];' % (start, body))
+            for target, kind in leaving:
+                if target in self.blocks:
+                    lines.append('  b%03x -> b%03x [label="%s"];' % (start, target, kind))
+        lines.append("}")
+        return "\n".join(lines) + "\n"
+
+
+def analyse(rom, cache_dir=CACHE_DIR, platform="chip8"):
+    """
+    Analyse `rom` (bytes) as code for `platform`, reading and filling the
+    on-disk cache unless `cache_dir` is None.
+    """
+    sha1 = hashlib.sha1(rom).hexdigest()
+    name = sha1 if platform == "chip8" else "%s-%s" % (sha1, platform)
+    path = os.path.join(cache_dir, name + ".json") if cache_dir else None
+    if path and os.path.exists(path):
+        try:
+            with open(path) as f:
+                return Analysis.from_json(json.load(f))
+        except (ValueError, KeyError):
+            pass  # Stale or damaged; analyse again and overwrite it.
+    analysis = Analysis.of(rom, platform)
+    if path:
+        partial = path + ".tmp"
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(partial, "w") as f:
+                json.dump(analysis.to_json(), f, separators=(",", ":"))
+            os.replace(partial, path)
+        except OSError:
+            pass  # The cache is an optimisation; an unwritable one is not an error.
+    return analysis
+
+
+def predecode(engine, analysis):
+    """
+    Build the handlers (and, for a BlockCache, the blocks) for the code found
+    by `analysis` ahead of time, so the first frames do not pay for decoding.
+    """
+    machine = getattr(engine, "machine", engine)
+    table = machine.table
+    for opcode in set(analysis.code.values()):
+        table[opcode]
+    compile_block = getattr(engine, "compile", None)
+    if compile_block is not None:
+        for start in analysis.blocks:
+            if start not in engine.blocks:
+                compile_block(start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Disassemble a Chip8 ROM and graph its control flow.")
+    parser.add_argument("rom")
+    parser.add_argument("--dot", help="write the control-flow graph here in Graphviz format")
+    parser.add_argument("--json", action="store_true", help="print the analysis as JSON instead")
+    parser.add_argument("--no-cache", action="store_true", help="neither read nor write the cache")
+    parser.add_argument("--platform", choices=PLATFORMS, default="chip8", help="instruction set (default: chip8)")
+    args = parser.parse_args(argv)
+    with open(args.rom, "rb") as f:
+        rom = f.read()
+    space = memory_size(args.platform) - PROGRAM_START
+    if len(rom) > space:
+        parser.error("ROM is %d bytes, at most %d fit in memory" % (len(rom), space))
+    analysis = analyse(rom, None if args.no_cache else CACHE_DIR, args.platform)
+    if args.json:
+        sys.stdout.write(json.dumps(analysis.to_json(), indent=2) + "\n")
+    else:
+        sys.stdout.write(analysis.disassembly(rom))
+    if args.dot:
+        with open(args.dot, "w") as f:
+            f.write(analysis.dot())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
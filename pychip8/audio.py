@@ -0,0 +1,148 @@
+from array import array
+from math import gcd
+
+TONE_HZ = 500
+VOLUME = 0.25
+TONE_CACHE = 64  # XO-CHIP tones kept; programs that stream samples change them every frame.
+
+
+def pattern_rate(pitch):
+    """Bits per second an XO-CHIP audio pattern plays at for `pitch`."""
+    return 4000 * 2 ** ((pitch - 64) / 48)
+
+
+class NullSink:
+    """Plays nothing; used headless or when there is no audio device."""
+
+    def start(self, tone=None):
+        pass
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class PygameSink:
+    """
+    Loops a pre-generated square wave through pygame.mixer. The mixer plays
+    it on SDL's own audio thread, so starting and stopping cost one call
+    each and nothing runs in Python while the tone sounds.
+
+    `start()` can instead be given an XO-CHIP tone, (pattern, pitch); its
+    sound is generated the first time and kept, with the last few others,
+    for the next.
+    """
+
+    def __init__(self, frequency=TONE_HZ, volume=VOLUME):
+        import pygame
+
+        if not pygame.mixer.get_init():
+            pygame.mixer.init(frequency=44100, size=-16, channels=1, buffer=512)
+        rate, size, channels = pygame.mixer.get_init()
+        # The shortest buffer holding a whole number of periods, so looping
+        # it is seamless.
+        length = rate // gcd(rate, frequency)
+        amplitude = int(volume * 32767)
+        samples = array("h")
+        for i in range(length):
+            sample = amplitude if (2 * i * frequency // rate) % 2 == 0 else -amplitude
+            samples.extend([sample] * channels)
+        self.mixer = pygame.mixer
+        self.rate = rate
+        self.channels = channels
+        self.amplitude = amplitude
+        self.sound = pygame.mixer.Sound(buffer=samples.tobytes())
+        self.tones = {}
+        self.playing = None
+
+    def _tone(self, tone):
+        """The Sound for one whole loop of an XO-CHIP (pattern, pitch)."""
+        sound = self.tones.get(tone)
+        if sound is None:
+            pattern, pitch = tone
+            step = pattern_rate(pitch) / self.rate  # Pattern bits per sample.
+            amplitude = self.amplitude
+            samples = array("h")
+            for i in range(max(1, round(128 / step))):
+                bit = int(i * step) & 127
+                sample = amplitude if (pattern[bit >> 3] >> (7 - (bit & 7))) & 1 else -amplitude
+                samples.extend([sample] * self.channels)
+            if len(self.tones) >= TONE_CACHE:
+                self.tones.clear()
+            sound = self.tones[tone] = self.mixer.Sound(buffer=samples.tobytes())
+        return sound
+
+    def start(self, tone=None):
+        sound = self.sound if tone is None else self._tone(tone)
+        if sound is not self.playing:
+            self.stop()
+            sound.play(loops=-1)
+            self.playing = sound
+
+    def stop(self):
+        if self.playing is not None:
+            self.playing.stop()
+            self.playing = None
+
+    def close(self):
+        self.stop()
+
+
+def open_sink(headless=False, frequency=TONE_HZ, volume=VOLUME):
+    """A PygameSink, or a NullSink when headless or the mixer cannot start."""
+    if headless:
+        return NullSink()
+    try:
+        return PygameSink(frequency, volume)
+    except (ImportError, RuntimeError):  # pygame.error is a RuntimeError
+        return NullSink()
+
+
+class Audio:
+    """
+    Turns a machine's sound timer into start and stop calls on a sink.
+
+    The frontend calls `update()` once per frame; the sink is only touched
+    on the edges where the timer starts or stops running, so a silent
+    machine costs two comparisons a frame. Beeps shorter than a frame are
+    caught through `sound_ticks` and last one frame.
+
+    XO-CHIP machines play their audio pattern at their pitch instead of the
+    fixed tone; a change to either while sounding is an edge too.
+    """
+
+    def __init__(self, machine, sink=None):
+        self.machine = machine
+        self.sink = sink or NullSink()
+        self.ticks = machine.sound_ticks
+        self.sounding = False
+        self.patterned = machine.quirks.platform == "xochip"
+        self.tone = None
+
+    def update(self):
+        machine = self.machine
+        ticks = machine.sound_ticks
+        sounding = machine.sound_timer > 0 or ticks != self.ticks
+        self.ticks = ticks
+        tone = None
+        if sounding and self.patterned:
+            tone = (bytes(machine.pattern), machine.pitch)
+        if sounding != self.sounding or tone != self.tone:
+            self.sounding = sounding
+            self.tone = tone
+            if sounding:
+                self.sink.start(tone)
+            else:
+                self.sink.stop()
+
+    def silence(self):
+        """Stop the tone until the next update, e.g. while paused."""
+        if self.sounding:
+            self.sounding = False
+            self.tone = None
+            self.sink.stop()
+
+    def close(self):
+        self.sink.close()
@@ -0,0 +1,653 @@
+"""
+Many copies of one Chip8 program stepped in lockstep with NumPy.
+
+Every register is an array with one entry per lane, and lanes run along
+the last axis (v is (16, lanes), memory is (4096, lanes), the screen is
+(32, lanes) packed rows laid out like Framebuffer), so a register or an
+address across all lanes is one contiguous row. While every lane is at the
+same pc with the same opcode, which is most of the time, a step runs a
+handler decoded once for that opcode, with x/y/nn as plain ints working on
+whole rows such as `v[x]`. Otherwise it fetches one opcode per lane,
+groups lanes by opcode class, and runs one vectorised handler per class
+present. Opcode semantics follow decode.py, including the display wait;
+lanes only differ in their keys and in the random numbers they draw. Each
+lane has its own seed, and Cxnn's n-th draw on a lane is a hash of (seed,
+n), so lanes are independent and a lane's stream can be picked up at any
+point (see `LaneRandom`). Data reads and writes wrap at the end of memory,
+as decode's `read_memory` and `write_memory` do, and fetching an
+instruction past it raises IndexError as it does on a Chip8. Only the
+CHIP-8 platform is supported; SCHIP and XO-CHIP change the screen's shape
+as they run.
+
+NumPy is only needed for this module.
+"""
+import os
+import random
+from array import array
+
+import numpy as np
+
+from .decode import FONT_START, SCREEN_HEIGHT, SCREEN_WIDTH, DecodeTable, opcode_pattern
+from .machine import MEMORY_SIZE, PROGRAM_START, Chip8, fontset
+from .quirks import DEFAULT_PROFILE, PROFILES
+
+PATTERNS = sorted({opcode_pattern(opcode) for opcode in range(0x10000)})
+_pattern_ids = {pattern: number for number, pattern in enumerate(PATTERNS)}
+KIND = np.array([_pattern_ids[opcode_pattern(opcode)] for opcode in range(0x10000)], dtype=np.intp)
+# Index of the lowest set bit of every 16-bit key mask (0 for no keys).
+LOWEST_KEY = np.array([(mask & -mask).bit_length() - 1 if mask else 0 for mask in range(0x10000)])
+
+# SplitMix64's increment and finaliser constants.
+_GAMMA = 0x9E3779B97F4A7C15
+_MIX1 = 0xBF58476D1CE4E5B9
+_MIX2 = 0x94D049BB133111EB
+_MASK64 = (1 << 64) - 1
+
+
+def _mix(seed, draw):
+    """The 64-bit hash of draw number `draw` on a lane seeded `seed`."""
+    z = (seed + (draw + 1) * _GAMMA) & _MASK64
+    z = ((z ^ (z >> 30)) * _MIX1) & _MASK64
+    z = ((z ^ (z >> 27)) * _MIX2) & _MASK64
+    return z ^ (z >> 31)
+
+
+def _mix_lanes(seeds, draws):
+    """`_mix` over uint64 arrays, wrapping the same way."""
+    z = seeds + (draws + np.uint64(1)) * np.uint64(_GAMMA)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(_MIX1)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(_MIX2)
+    return z ^ (z >> np.uint64(31))
+
+
+class LaneRandom:
+    """
+    A batch lane's generator, standing in for the random.Random a Chip8
+    draws Cxnn values from, so a machine taken out of a batch goes on
+    drawing what its lane would have.
+    """
+
+    __slots__ = ("lane_seed", "draws")
+
+    def __init__(self, seed=0, draws=0):
+        self.lane_seed = seed
+        self.draws = draws
+
+    def seed(self, seed):
+        self.lane_seed = seed
+        self.draws = 0
+
+    def getrandbits(self, k):
+        value = _mix(self.lane_seed, self.draws) >> (64 - k)
+        self.draws += 1
+        return value
+
+
+def _decode_uniform(batch, opcode):
+    """
+    Return a zero-argument handler running `opcode` on every lane of
+    `batch`, for steps where all lanes fetched it. Opcodes without a
+    row-wide form run their class handler over all lanes.
+    """
+    quirks = batch.quirks
+    every = batch.all
+    memory = batch.memory
+    v = batch.v
+    pc = batch.pc
+    index = batch.index
+    x = (opcode & 0x0F00) >> 8
+    y = (opcode & 0x00F0) >> 4
+    nn = opcode & 0x00FF
+    nnn = opcode & 0x0FFF
+    pattern = PATTERNS[KIND[opcode]]
+    logic_flag = 0 if quirks.vf_reset else None
+    shifted = v[y] if quirks.shift_vy else v[x]
+
+    def alu(result, flag=None):
+        v[x] = result
+        if flag is not None:
+            v[0xF] = flag
+
+    if pattern == "00E0":
+        screen = batch.screen
+
+        def cls():
+            screen[:] = 0
+
+        return cls
+    if pattern == "1nnn":
+
+        def jp():
+            pc[:] = nnn
+
+        return jp
+    if pattern == "3xnn":
+
+        def se_byte():
+            pc[:] += (v[x] == nn) * 2
+
+        return se_byte
+    if pattern == "4xnn":
+
+        def sne_byte():
+            pc[:] += (v[x] != nn) * 2
+
+        return sne_byte
+    if pattern == "5xy0":
+
+        def se_reg():
+            pc[:] += (v[x] == v[y]) * 2
+
+        return se_reg
+    if pattern == "9xy0":
+
+        def sne_reg():
+            pc[:] += (v[x] != v[y]) * 2
+
+        return sne_reg
+    if pattern == "6xnn":
+
+        def ld_byte():
+            v[x] = nn
+
+        return ld_byte
+    if pattern == "7xnn":
+
+        def add_byte():
+            v[x] += nn
+            v[x] &= 0xFF
+
+        return add_byte
+    if pattern == "8xy0":
+
+        def ld_reg():
+            v[x] = v[y]
+
+        return ld_reg
+    if pattern == "8xy1":
+
+        def or_reg():
+            alu(v[x] | v[y], logic_flag)
+
+        return or_reg
+    if pattern == "8xy2":
+
+        def and_reg():
+            alu(v[x] & v[y], logic_flag)
+
+        return and_reg
+    if pattern == "8xy3":
+
+        def xor_reg():
+            alu(v[x] ^ v[y], logic_flag)
+
+        return xor_reg
+    if pattern == "8xy4":
+
+        def add_reg():
+            added = v[x] + v[y]
+            alu(added & 0xFF, added >> 8)
+
+        return add_reg
+    if pattern == "8xy5":
+
+        def sub_reg():
+            alu((v[x] - v[y]) & 0xFF, v[x] >= v[y])
+
+        return sub_reg
+    if pattern == "8xy6":
+
+        def shr():
+            alu(shifted >> 1, shifted & 1)
+
+        return shr
+    if pattern == "8xy7":
+
+        def subn_reg():
+            alu((v[y] - v[x]) & 0xFF, v[y] >= v[x])
+
+        return subn_reg
+    if pattern == "8xyE":
+
+        def shl():
+            alu((shifted << 1) & 0xFF, shifted >> 7)
+
+        return shl
+    if pattern == "Annn":
+
+        def ld_index():
+            index[:] = nnn
+
+        return ld_index
+    if pattern == "Bnnn":
+        offset = v[x] if quirks.jump_vx else v[0]
+
+        def jp_offset():
+            pc[:] = nnn + offset
+
+        return jp_offset
+    if pattern == "Dxyn":
+        screen = batch.screen
+        n = opcode & 0x000F
+        offsets = np.arange(n)[:, None]
+
+        def drw():
+            if quirks.display_wait and not batch.vblank:
+                pc[:] -= 2
+                return
+            left = v[x] % SCREEN_WIDTH
+            top = v[y] % SCREEN_HEIGHT
+            shift = SCREEN_WIDTH - 8 - left
+            left_shift = np.maximum(shift, 0).astype(np.uint64)
+            right_shift = np.maximum(-shift, 0).astype(np.uint64)
+            sprite = memory[(index + offsets) & 0xFFF, every].astype(np.uint64)
+            collision = np.zeros(batch.lanes, dtype=bool)
+            for row in range(n):
+                # Rows past the bottom are clipped: they XOR nothing into the last row.
+                rows = top + row
+                bits = ((sprite[row] << left_shift) >> right_shift) * (rows < SCREEN_HEIGHT)
+                rows = np.minimum(rows, SCREEN_HEIGHT - 1)
+                old = screen[rows, every]
+                collision |= (old & bits) != 0
+                screen[rows, every] = old ^ bits
+            v[0xF] = collision
+
+        return drw
+    if pattern in ("Ex9E", "ExA1"):
+        pressed = pattern == "Ex9E"
+        keys = batch.keys
+
+        def skip_key():
+            pc[:] += (((keys >> (v[x] & 0xF)) & 1) == pressed) * 2
+
+        return skip_key
+    if pattern == "Fx07":
+        delay_timer = batch.delay_timer
+
+        def ld_delay():
+            v[x] = delay_timer
+
+        return ld_delay
+    if pattern in ("Fx15", "Fx18"):
+        timer = batch.delay_timer if pattern == "Fx15" else batch.sound_timer
+
+        def set_timer():
+            timer[:] = v[x]
+
+        return set_timer
+    if pattern == "Fx1E":
+
+        def add_index():
+            index[:] += v[x]
+
+        return add_index
+    if pattern == "Fx29":
+
+        def ld_font():
+            index[:] = FONT_START + 5 * v[x]
+
+        return ld_font
+    if pattern == "Fx33":
+
+        def bcd():
+            value = v[x]
+            memory[index & 0xFFF, every] = value // 100
+            memory[(index + 1) & 0xFFF, every] = (value // 10) % 10
+            memory[(index + 2) & 0xFFF, every] = value % 10
+
+        return bcd
+    if pattern == "Fx55":
+        step = batch._index_step(x)
+
+        def save():
+            for register in range(x + 1):
+                memory[(index + register) & 0xFFF, every] = v[register]
+            index[:] += step
+
+        return save
+    if pattern == "Fx65":
+        step = batch._index_step(x)
+
+        def load():
+            for register in range(x + 1):
+                v[register] = memory[(index + register) & 0xFFF, every]
+            index[:] += step
+
+        return load
+    handler = batch.handlers[KIND[opcode]]
+    opcodes = np.full(batch.lanes, opcode, dtype=np.int64)
+
+    def every_lane():
+        handler(every, opcodes)
+
+    return every_lane
+
+
+class BatchMachine:
+    """
+    `lanes` machines running the same ROM, as a struct of arrays.
+
+    `seed` is either one int, from which every lane's seed is derived, or
+    a sequence of one seed per lane.
+    """
+
+    def __init__(self, rom, lanes, ipf=8, seed=None, quirks=DEFAULT_PROFILE):
+        self.lanes = lanes
+        self.ipf = ipf
+        # Checked once per vectorised handler call, not per lane.
+        self.quirks = PROFILES[quirks] if isinstance(quirks, str) else quirks
+        if self.quirks.platform != "chip8":
+            raise ValueError("the batch engine only runs CHIP-8, not %s" % self.quirks.platform)
+        if seed is None:
+            seed = random.getrandbits(64)
+        if isinstance(seed, int):
+            seed = [_mix(seed, lane) for lane in range(lanes)]
+        if len(seed) != lanes:
+            raise ValueError("%d seeds for %d lanes" % (len(seed), lanes))
+        self.seeds = np.array(seed, dtype=np.uint64)
+        self.draws = np.zeros(lanes, dtype=np.uint64)  # Cxnn draws so far per lane.
+        self.all = np.arange(lanes)
+        self.memory = np.zeros((MEMORY_SIZE, lanes), dtype=np.uint8)
+        self.memory[FONT_START : FONT_START + len(fontset)] = np.frombuffer(fontset, dtype=np.uint8)[:, None]
+        self.v = np.zeros((16, lanes), dtype=np.int64)
+        self.stack = np.zeros((16, lanes), dtype=np.int64)
+        self.sp = np.zeros(lanes, dtype=np.int64)
+        self.pc = np.full(lanes, PROGRAM_START, dtype=np.int64)
+        self.index = np.zeros(lanes, dtype=np.int64)
+        self.delay_timer = np.zeros(lanes, dtype=np.int64)
+        self.sound_timer = np.zeros(lanes, dtype=np.int64)
+        self.keys = np.zeros(lanes, dtype=np.int64)
+        self.key_wait = np.zeros(lanes, dtype=bool)
+        self.key_wait_index = np.zeros(lanes, dtype=np.int64)
+        self.screen = np.zeros((SCREEN_HEIGHT, lanes), dtype=np.uint64)
+        self.vblank = False
+        self.frame_cycle = 0
+        self.handlers = [getattr(self, "_op_" + pattern.replace("?", "_")) for pattern in PATTERNS]
+        self.uniform = DecodeTable(self, _decode_uniform)
+        if isinstance(rom, (str, os.PathLike)):
+            with open(rom, "rb") as f:
+                rom = f.read()
+        if len(rom) > MEMORY_SIZE - PROGRAM_START:
+            raise ValueError("ROM is %d bytes, at most %d fit in memory" % (len(rom), MEMORY_SIZE - PROGRAM_START))
+        self.memory[PROGRAM_START : PROGRAM_START + len(rom)] = np.frombuffer(rom, dtype=np.uint8)[:, None]
+
+    def execute(self):
+        """One instruction on every lane, leaving the frame and the timers alone."""
+        memory = self.memory
+        pc = self.pc
+        first = int(pc[0])
+        if (pc == first).all():
+            if first > MEMORY_SIZE - 2:
+                raise IndexError("pc ran off the end of memory")
+            high = memory[first]
+            low = memory[first + 1]
+            if (high == high[0]).all() and (low == low[0]).all():
+                pc += 2
+                self.uniform[int(high[0]) << 8 | int(low[0])]()
+                self.vblank = False
+                return
+        elif pc.max() > MEMORY_SIZE - 2:
+            raise IndexError("pc ran off the end of memory")
+        opcodes = (memory[pc, self.all].astype(np.int64) << 8) | memory[pc + 1, self.all]
+        pc += 2
+        kinds = KIND[opcodes]
+        first = kinds[0]
+        if (kinds == first).all():
+            self.handlers[first](self.all, opcodes)
+        else:
+            for kind in np.flatnonzero(np.bincount(kinds, minlength=len(PATTERNS))):
+                lanes = np.flatnonzero(kinds == kind)
+                self.handlers[kind](lanes, opcodes[lanes])
+        self.vblank = False
+
+    def tick_timers(self):
+        np.maximum(self.delay_timer - 1, 0, out=self.delay_timer)
+        np.maximum(self.sound_timer - 1, 0, out=self.sound_timer)
+
+    def step(self):
+        """One instruction on every lane as part of the frame, as `Chip8.step()`."""
+        self.vblank = not self.frame_cycle
+        self.execute()
+        self.frame_cycle += 1
+        if self.frame_cycle >= self.ipf:
+            self.frame_cycle = 0
+            self.tick_timers()
+
+    def frame(self):
+        """The rest of the 60 Hz frame on every lane, the same as `Chip8.frame()`."""
+        done = self.frame_cycle
+        self.frame_cycle = 0
+        if done < self.ipf:
+            self.vblank = not done
+            for _ in range(self.ipf - done):
+                self.execute()
+        self.tick_timers()
+
+    def run(self, cycles):
+        while cycles and self.frame_cycle:
+            self.step()
+            cycles -= 1
+        frames, rest = divmod(cycles, self.ipf)
+        for _ in range(frames):
+            self.frame()
+        for _ in range(rest):
+            self.step()
+
+    def machine(self, lane):
+        """A standalone Chip8 with the state of one lane."""
+        single = Chip8(quirks=self.quirks, seed=int(self.seeds[lane]))
+        single.rng = LaneRandom(single.seed, int(self.draws[lane]))
+        single.memory[:] = self.memory[:, lane].tobytes()
+        single.v[:] = bytes(self.v[:, lane].astype(np.uint8))
+        single.stack[:] = array("H", self.stack[:, lane].astype(np.uint16).tobytes())
+        single.sp = int(self.sp[lane])
+        single.pc = int(self.pc[lane])
+        single.index = int(self.index[lane])
+        single.delay_timer = int(self.delay_timer[lane])
+        single.sound_timer = int(self.sound_timer[lane])
+        single.keys = int(self.keys[lane])
+        single.vblank = self.vblank
+        single.frame_cycle = self.frame_cycle
+        single.key_wait = bool(self.key_wait[lane])
+        single.key_wait_index = int(self.key_wait_index[lane])
+        single.screen.rows[:] = [int(row) for row in self.screen[:, lane]]
+        return single
+
+    # Handlers take the lanes running this opcode class and their opcodes.
+
+    def _op_00E0(self, lanes, opcodes):
+        self.screen[:, lanes] = 0
+
+    def _op_00EE(self, lanes, opcodes):
+        self.sp[lanes] = (self.sp[lanes] - 1) & 15
+        self.pc[lanes] = self.stack[self.sp[lanes], lanes]
+
+    def _op_0nnn(self, lanes, opcodes):
+        pass
+
+    def _op_1nnn(self, lanes, opcodes):
+        self.pc[lanes] = opcodes & 0x0FFF
+
+    def _op_2nnn(self, lanes, opcodes):
+        self.stack[self.sp[lanes], lanes] = self.pc[lanes]
+        self.sp[lanes] += 1
+        self.pc[lanes] = opcodes & 0x0FFF
+
+    def _skip_if(self, lanes, condition):
+        self.pc[lanes] += condition * 2
+
+    def _vx(self, lanes, opcodes):
+        return self.v[(opcodes >> 8) & 0xF, lanes]
+
+    def _vy(self, lanes, opcodes):
+        return self.v[(opcodes >> 4) & 0xF, lanes]
+
+    def _op_3xnn(self, lanes, opcodes):
+        self._skip_if(lanes, self._vx(lanes, opcodes) == (opcodes & 0xFF))
+
+    def _op_4xnn(self, lanes, opcodes):
+        self._skip_if(lanes, self._vx(lanes, opcodes) != (opcodes & 0xFF))
+
+    def _op_5xy0(self, lanes, opcodes):
+        self._skip_if(lanes, self._vx(lanes, opcodes) == self._vy(lanes, opcodes))
+
+    def _op_9xy0(self, lanes, opcodes):
+        self._skip_if(lanes, self._vx(lanes, opcodes) != self._vy(lanes, opcodes))
+
+    def _op_6xnn(self, lanes, opcodes):
+        self.v[(opcodes >> 8) & 0xF, lanes] = opcodes & 0xFF
+
+    def _op_7xnn(self, lanes, opcodes):
+        x = (opcodes >> 8) & 0xF
+        self.v[x, lanes] = (self.v[x, lanes] + (opcodes & 0xFF)) & 0xFF
+
+    def _alu(self, lanes, opcodes, result, flag=None):
+        self.v[(opcodes >> 8) & 0xF, lanes] = result
+        if flag is not None:
+            self.v[0xF, lanes] = flag
+
+    def _logic_flag(self):
+        return 0 if self.quirks.vf_reset else None
+
+    def _shifted(self, lanes, opcodes):
+        return self._vy(lanes, opcodes) if self.quirks.shift_vy else self._vx(lanes, opcodes)
+
+    def _op_8xy0(self, lanes, opcodes):
+        self._alu(lanes, opcodes, self._vy(lanes, opcodes))
+
+    def _op_8xy1(self, lanes, opcodes):
+        self._alu(lanes, opcodes, self._vx(lanes, opcodes) | self._vy(lanes, opcodes), self._logic_flag())
+
+    def _op_8xy2(self, lanes, opcodes):
+        self._alu(lanes, opcodes, self._vx(lanes, opcodes) & self._vy(lanes, opcodes), self._logic_flag())
+
+    def _op_8xy3(self, lanes, opcodes):
+        self._alu(lanes, opcodes, self._vx(lanes, opcodes) ^ self._vy(lanes, opcodes), self._logic_flag())
+
+    def _op_8xy4(self, lanes, opcodes):
+        added = self._vx(lanes, opcodes) + self._vy(lanes, opcodes)
+        self._alu(lanes, opcodes, added & 0xFF, added >> 8)
+
+    def _op_8xy5(self, lanes, opcodes):
+        vx = self._vx(lanes, opcodes)
+        vy = self._vy(lanes, opcodes)
+        self._alu(lanes, opcodes, (vx - vy) & 0xFF, vx >= vy)
+
+    def _op_8xy6(self, lanes, opcodes):
+        value = self._shifted(lanes, opcodes)
+        self._alu(lanes, opcodes, value >> 1, value & 1)
+
+    def _op_8xy7(self, lanes, opcodes):
+        vx = self._vx(lanes, opcodes)
+        vy = self._vy(lanes, opcodes)
+        self._alu(lanes, opcodes, (vy - vx) & 0xFF, vy >= vx)
+
+    def _op_8xyE(self, lanes, opcodes):
+        value = self._shifted(lanes, opcodes)
+        self._alu(lanes, opcodes, (value << 1) & 0xFF, value >> 7)
+
+    def _op_8xy_(self, lanes, opcodes):
+        pass
+
+    def _op_Annn(self, lanes, opcodes):
+        self.index[lanes] = opcodes & 0x0FFF
+
+    def _op_Bnnn(self, lanes, opcodes):
+        offset = self._vx(lanes, opcodes) if self.quirks.jump_vx else self.v[0, lanes]
+        self.pc[lanes] = (opcodes & 0x0FFF) + offset
+
+    def _op_Cxnn(self, lanes, opcodes):
+        draws = self.draws[lanes]
+        values = (_mix_lanes(self.seeds[lanes], draws) >> np.uint64(56)).astype(np.int64)
+        self.draws[lanes] = draws + np.uint64(1)
+        self.v[(opcodes >> 8) & 0xF, lanes] = values & opcodes & 0xFF
+
+    def _op_Dxyn(self, lanes, opcodes):
+        if self.quirks.display_wait and not self.vblank:
+            self.pc[lanes] -= 2
+            return
+        left = self._vx(lanes, opcodes) % SCREEN_WIDTH
+        top = self._vy(lanes, opcodes) % SCREEN_HEIGHT
+        heights = np.minimum(opcodes & 0xF, SCREEN_HEIGHT - top)
+        index = self.index[lanes]
+        shift = SCREEN_WIDTH - 8 - left
+        left_shift = np.maximum(shift, 0).astype(np.uint64)
+        right_shift = np.maximum(-shift, 0).astype(np.uint64)
+        collision = np.zeros(len(lanes), dtype=bool)
+        # Read the whole sprite before drawing, as the interpreter does.
+        sprite = self.memory[(index[:, None] + np.arange(16)) & 0xFFF, lanes[:, None]].astype(np.uint64)
+        for row in range(int(heights.max(initial=0))):
+            drawing = np.flatnonzero(row < heights)
+            line = sprite[drawing, row]
+            bits = (line << left_shift[drawing]) >> right_shift[drawing]
+            target = lanes[drawing]
+            y = top[drawing] + row
+            old = self.screen[y, target]
+            collision[drawing] |= (old & bits) != 0
+            self.screen[y, target] = old ^ bits
+        self.v[0xF, lanes] = collision
+
+    def _op_Ex9E(self, lanes, opcodes):
+        self._skip_if(lanes, (self.keys[lanes] >> (self._vx(lanes, opcodes) & 0xF)) & 1)
+
+    def _op_ExA1(self, lanes, opcodes):
+        self._skip_if(lanes, 1 - ((self.keys[lanes] >> (self._vx(lanes, opcodes) & 0xF)) & 1))
+
+    def _op_Ex__(self, lanes, opcodes):
+        pass
+
+    def _op_Fx07(self, lanes, opcodes):
+        self.v[(opcodes >> 8) & 0xF, lanes] = self.delay_timer[lanes]
+
+    def _op_Fx0A(self, lanes, opcodes):
+        keys = self.keys[lanes]
+        pressed = keys != 0
+        released = ~pressed & self.key_wait[lanes]
+        held = lanes[pressed]
+        self.key_wait_index[held] = LOWEST_KEY[keys[pressed]]
+        self.key_wait[held] = True
+        done = lanes[released]
+        self.v[(opcodes[released] >> 8) & 0xF, done] = self.key_wait_index[done]
+        self.key_wait[done] = False
+        self.pc[lanes[~released]] -= 2
+
+    def _op_Fx15(self, lanes, opcodes):
+        self.delay_timer[lanes] = self._vx(lanes, opcodes)
+
+    def _op_Fx18(self, lanes, opcodes):
+        self.sound_timer[lanes] = self._vx(lanes, opcodes)
+
+    def _op_Fx1E(self, lanes, opcodes):
+        self.index[lanes] += self._vx(lanes, opcodes)
+
+    def _op_Fx29(self, lanes, opcodes):
+        self.index[lanes] = FONT_START + 5 * self._vx(lanes, opcodes)
+
+    def _op_Fx33(self, lanes, opcodes):
+        value = self._vx(lanes, opcodes)
+        index = self.index[lanes]
+        self.memory[index & 0xFFF, lanes] = value // 100
+        self.memory[(index + 1) & 0xFFF, lanes] = (value // 10) % 10
+        self.memory[(index + 2) & 0xFFF, lanes] = value % 10
+
+    def _index_step(self, x):
+        return {"x+1": x + 1, "x": x, "1": 1, "0": 0}[self.quirks.index_increment]
+
+    def _op_Fx55(self, lanes, opcodes):
+        x = (opcodes >> 8) & 0xF
+        index = self.index[lanes]
+        for register in range(int(x.max()) + 1):
+            storing = register <= x
+            self.memory[(index[storing] + register) & 0xFFF, lanes[storing]] = self.v[register, lanes[storing]]
+        self.index[lanes] = index + self._index_step(x)
+
+    def _op_Fx65(self, lanes, opcodes):
+        x = (opcodes >> 8) & 0xF
+        index = self.index[lanes]
+        for register in range(int(x.max()) + 1):
+            loading = register <= x
+            self.v[register, lanes[loading]] = self.memory[(index[loading] + register) & 0xFFF, lanes[loading]]
+        self.index[lanes] = index + self._index_step(x)
+
+    def _op_Fx__(self, lanes, opcodes):
+        pass
@@ -0,0 +1,220 @@
+"""
+Fixed, reproducible workloads for comparing emulator performance.
+
+    python -m pychip8.benchmark --output before.json
+
+Every workload runs headless and unthrottled for the same number of
+frames on each engine, after a short warm-up, and reports executed
+instructions and frames per second. Idle loops skipped to the end of a
+frame and draws waiting on the display are not counted as executed, so
+instructions are counted in a separate pass on the interpreter rather
+than taken as frames * ipf. A second, shorter pass measures
+memory traffic per frame: the peak bytes allocated within a frame and the
+net number of blocks a frame leaves behind. Results are printed, and
+optionally written, as JSON.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from .jit import BlockCache
+from .machine import Chip8
+from .profiler import Profiler
+from .quirks import DEFAULT_PROFILE
+
+SUITE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "testroms", "chip8-test-suite.ch8")
+
+# 6xnn/7xnn/8xy4 in a tight loop.
+ALU_ROM = bytes.fromhex(
+    "6001"  # 200: V0 = 01
+    "6102"  # 202: V1 = 02
+    "7001"  # 204: V0 += 01
+    "8014"  # 206: V0 += V1
+    "7203"  # 208: V2 += 03
+    "8124"  # 20a: V1 += V2
+    "1204"  # 20c: jump 204
+)
+# Font sprites drawn at drifting positions, so they wrap and collide.
+SPRITE_ROM = bytes.fromhex(
+    "6000"  # 200: V0 = 00
+    "6100"  # 202: V1 = 00
+    "6200"  # 204: V2 = 00
+    "f229"  # 206: I = font(V2)
+    "d015"  # 208: draw V0, V1
+    "7005"  # 20a: V0 += 05
+    "7103"  # 20c: V1 += 03
+    "7201"  # 20e: V2 += 01
+    "1206"  # 210: jump 206
+)
+# Fx55/Fx65 bursts through a sliding window of memory, counted in VF.
+MEMORY_ROM = bytes.fromhex(
+    "6f00"  # 200: VF = 00
+    "a300"  # 202: I = 300
+    "fe55"  # 204: store V0-VE
+    "fe65"  # 206: load V0-VE
+    "7f01"  # 208: VF += 01
+    "3f00"  # 20a: skip if VF == 00
+    "1204"  # 20c: jump 204
+    "1202"  # 20e: jump 202
+)
+# A 16x16 ring and a 16x16 frame, for the SCHIP and XO-CHIP workloads.
+RING = bytes.fromhex("07e0 1ff8 3ffc 7ffe 7ffe fe7f fc3f f81f f81f fc3f fe7f 7ffe 7ffe 3ffc 1ff8 07e0")
+FRAME = bytes.fromhex("ffff" + "8001" * 14 + "ffff")
+# SCHIP hi-res: 16x16 sprites and scrolling every iteration.
+HIRES_ROM = bytes.fromhex(
+    "00ff"  # 200: hi-res
+    "6000"  # 202: V0 = 00
+    "6100"  # 204: V1 = 00
+    "a216"  # 206: I = ring
+    "d010"  # 208: draw 16x16 at V0, V1
+    "7007"  # 20a: V0 += 07
+    "7105"  # 20c: V1 += 05
+    "00c1"  # 20e: scroll down 1
+    "00fb"  # 210: scroll right 4
+    "00fc"  # 212: scroll left 4
+    "1208"  # 214: jump 208
+) + RING
+# XO-CHIP: the same on both bit-planes at once.
+PLANES_ROM = bytes.fromhex(
+    "00ff"  # 200: hi-res
+    "f301"  # 202: select planes 1 and 2
+    "6000"  # 204: V0 = 00
+    "6100"  # 206: V1 = 00
+    "a216"  # 208: I = ring, then frame
+    "d010"  # 20a: draw 16x16 on both planes at V0, V1
+    "7009"  # 20c: V0 += 09
+    "7103"  # 20e: V1 += 03
+    "00d1"  # 210: scroll up 1
+    "00fc"  # 212: scroll left 4
+    "120a"  # 214: jump 20a
+) + RING + FRAME
+
+# name: (rom, memory pokes per run); the instruction budget is split between runs.
+WORKLOADS = {
+    "alu": (ALU_ROM, [{}]),
+    "sprite": (SPRITE_ROM, [{}]),
+    "memory": (MEMORY_ROM, [{}]),
+    "suite": (SUITE, [{0x1FF: test} for test in (1, 2, 3, 4)]),
+    "hires": (HIRES_ROM, [{}]),
+    "planes": (PLANES_ROM, [{}]),
+}
+# Quirk profiles per workload: those that draw run without the display
+# wait, which would otherwise have them timing a wait for the next frame.
+PROFILES = {"sprite": "modern", "suite": "modern", "hires": "schip", "planes": "xochip"}
+ENGINES = ("interpreter", "jit")
+
+
+def _engine(rom, poke, ipf, engine, quirks=DEFAULT_PROFILE):
+    machine = Chip8(rom, ipf=ipf, seed=0, quirks=quirks)
+    for address, value in poke.items():
+        machine.memory[address] = value
+    return BlockCache(machine) if engine == "jit" else machine
+
+
+def _executed(name, ipf, frames, warmup):
+    """
+    Instructions the workload executes in `frames` frames after the
+    warm-up, over all of its runs, counted with a Profiler on the
+    interpreter.
+    """
+    rom, pokes = WORKLOADS[name]
+    executed = 0
+    for poke in pokes:
+        machine = _engine(rom, poke, ipf, "interpreter", PROFILES.get(name, DEFAULT_PROFILE))
+        for _ in range(warmup):
+            machine.frame()
+        profiler = Profiler(machine)
+        profiler.attach()
+        for _ in range(frames):
+            machine.frame()
+        executed += sum(profiler.opcodes.values())
+    return executed
+
+
+def measure(name, engine="interpreter", instructions=1000000, ipf=8, warmup=60, sample=120):
+    """Run one workload on one engine and return its results as a dict."""
+    rom, pokes = WORKLOADS[name]
+    frames = instructions // ipf // len(pokes)
+    elapsed = 0.0
+    alloc_bytes = 0
+    alloc_blocks = 0
+    for poke in pokes:
+        target = _engine(rom, poke, ipf, engine, PROFILES.get(name, DEFAULT_PROFILE))
+        for _ in range(warmup):
+            target.frame()
+        gc.collect()
+        started = time.perf_counter()
+        for _ in range(frames):
+            target.frame()
+        elapsed += time.perf_counter() - started
+
+        blocks = sys.getallocatedblocks()
+        for _ in range(sample):
+            target.frame()
+        alloc_blocks += sys.getallocatedblocks() - blocks
+        tracemalloc.start()
+        try:
+            for _ in range(sample):
+                tracemalloc.reset_peak()
+                current = tracemalloc.get_traced_memory()[0]
+                target.frame()
+                alloc_bytes += tracemalloc.get_traced_memory()[1] - current
+        finally:
+            tracemalloc.stop()
+    executed = _executed(name, ipf, frames, warmup)
+    frames *= len(pokes)
+    sampled = sample * len(pokes)
+    return {
+        "workload": name,
+        "engine": engine,
+        "quirks": PROFILES.get(name, DEFAULT_PROFILE),
+        "instructions": executed,
+        "scheduled": frames * ipf,
+        "frames": frames,
+        "seconds": elapsed,
+        "ips": executed / elapsed,
+        "fps": frames / elapsed,
+        "alloc_bytes_per_frame": alloc_bytes / sampled,
+        "alloc_blocks_per_frame": alloc_blocks / sampled,
+    }
+
+
+def run(workloads=None, engines=ENGINES, instructions=1000000, ipf=8):
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "instructions": instructions,
+        "ipf": ipf,
+        "results": [
+            measure(name, engine, instructions, ipf)
+            for name in (workloads or list(WORKLOADS))
+            for engine in engines
+        ],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Chip8 engines on fixed workloads.")
+    parser.add_argument("--workload", action="append", choices=sorted(WORKLOADS), help="run only these (repeatable)")
+    parser.add_argument("--engine", action="append", choices=ENGINES, help="run only these (repeatable)")
+    parser.add_argument("--instructions", type=int, default=1000000, help="instructions scheduled per workload")
+    parser.add_argument("--ipf", type=int, default=8, help="instructions per frame")
+    parser.add_argument("--output", help="also write the JSON results here")
+    args = parser.parse_args(argv)
+    results = run(args.workload, args.engine or ENGINES, args.instructions, args.ipf)
+    data = json.dumps(results, indent=2) + "\n"
+    sys.stdout.write(data)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(data)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Headless conformance runs over a directory of ROMs.
+
+    python -m pychip8.conformance testroms
+
+Each case runs a ROM unthrottled for a fixed number of frames in a worker
+process and compares a hash of the final framebuffer with the golden hash
+stored in `<directory>/golden.json`. Cases are listed there as
+
+    {"name": ..., "rom": ..., "frames": ..., "ipf": ..., "seed": ...,
+     "quirks": "vip", "poke": {"1ff": 2}, "keys": [[60, 8], [70, 0]],
+     "screen": <sha1>}
+
+where `poke` writes bytes into memory after loading (the test suite picks
+its test from 0x1FF this way) and `keys` is a list of [frame, mask] key
+changes played back through ScriptedInput, for tests driven from the
+keypad. ROMs in the directory without a case get a default one;
+`--update` writes the hashes of this run back as golden.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .input import ScriptedInput
+from .jit import BlockCache
+from .machine import Chip8
+from .quirks import DEFAULT_PROFILE
+
+GOLDEN_FILE = "golden.json"
+DEFAULT_FRAMES = 600
+DEFAULT_IPF = 8
+
+
+def run_case(path, frames, ipf=DEFAULT_IPF, seed=0, poke=None, jit=False, quirks=DEFAULT_PROFILE, keys=None):
+    """Run one ROM headless; returns (screen sha1, seconds taken)."""
+    started = time.perf_counter()
+    machine = Chip8(path, ipf=ipf, seed=seed, quirks=quirks)
+    for address, value in (poke or {}).items():
+        machine.memory[int(address, 16)] = value
+    engine = BlockCache(machine) if jit else machine
+    source = ScriptedInput(keys or [])
+    for frame in range(frames):
+        machine.keys = source.poll(frame)
+        engine.frame()
+    return hashlib.sha1(machine.screen.tobytes()).hexdigest(), time.perf_counter() - started
+
+
+def load_cases(directory, frames=DEFAULT_FRAMES):
+    """Cases from the golden file, plus a default case for every other ROM."""
+    path = os.path.join(directory, GOLDEN_FILE)
+    cases = []
+    if os.path.exists(path):
+        with open(path) as f:
+            cases = json.load(f)
+    covered = {case["rom"] for case in cases}
+    for rom in sorted(os.listdir(directory)):
+        if rom.endswith(".ch8") and rom not in covered:
+            cases.append({"name": rom, "rom": rom, "frames": frames})
+    return cases
+
+
+def run_cases(directory, cases, jit=False, workers=None):
+    """Run every case across a process pool; yields (case, screen, seconds) in order."""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(
+                run_case,
+                os.path.join(directory, case["rom"]),
+                case["frames"],
+                case.get("ipf", DEFAULT_IPF),
+                case.get("seed", 0),
+                case.get("poke"),
+                jit,
+                case.get("quirks", DEFAULT_PROFILE),
+                case.get("keys"),
+            )
+            for case in cases
+        ]
+        for case, future in zip(cases, futures):
+            screen, seconds = future.result()
+            yield case, screen, seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a directory of ROMs headless against golden hashes.")
+    parser.add_argument("directory", help="directory of .ch8 ROMs and their golden.json")
+    parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES, help="frames to run ROMs with no golden case")
+    parser.add_argument("--jit", action="store_true", help="use the block cache engine")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--update", action="store_true", help="store this run's hashes as golden")
+    args = parser.parse_args(argv)
+    cases = load_cases(args.directory, args.frames)
+    failures = 0
+    started = time.perf_counter()
+    for case, screen, seconds in run_cases(args.directory, cases, args.jit, args.workers):
+        expected = case.get("screen")
+        if expected is None:
+            status = "NEW"
+        elif screen == expected:
+            status = "PASS"
+        else:
+            status = "FAIL"
+            failures += 1
+        print("%-4s  %-34s %6.2fs  %s" % (status, case["name"], seconds, screen))
+        case["screen"] = screen
+    print(
+        "%d cases, %d failed, %.2fs"
+        % (len(cases), failures, time.perf_counter() - started)
+    )
+    if args.update:
+        with open(os.path.join(args.directory, GOLDEN_FILE), "w") as f:
+            json.dump(cases, f, indent=2)
+            f.write("\n")
+    return 1 if failures and not args.update else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
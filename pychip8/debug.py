@@ -0,0 +1,80 @@
+import json
+import sys
+import time
+
+
+def snapshot(machine):
+    """A consistent copy of the machine's registers, taken between instructions."""
+    return {
+        "pc": machine.pc,
+        "opcode": machine.opcode,
+        "index": machine.index,
+        "sp": machine.sp,
+        "stack": list(machine.stack[: machine.sp]),
+        "v": list(machine.v),
+        "delay_timer": machine.delay_timer,
+        "sound_timer": machine.sound_timer,
+        "keys": machine.keys,
+    }
+
+
+class TerminalOutput:
+    """Redraws a fixed block of lines in place on an ANSI terminal."""
+
+    LINES = 22
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.started = False
+
+    def write(self, state):
+        lines = ["V%X: %02x" % (i, value) for i, value in enumerate(state["v"])]
+        lines.append("opcode: %04x" % state["opcode"])
+        lines.append("pc: %03x   I: %03x" % (state["pc"], state["index"]))
+        lines.append("stack: " + " ".join("%03x" % address for address in state["stack"]))
+        lines.append("DT: %d" % state["delay_timer"])
+        lines.append("ST: %d" % state["sound_timer"])
+        lines.append("keys: %04x" % state["keys"])
+        if self.started:
+            self.stream.write("\033[%dA" % self.LINES)
+        else:
+            self.stream.write("Starting debugging process.\n")
+            self.started = True
+        self.stream.write("".join(line.ljust(40) + "\n" for line in lines))
+        self.stream.flush()
+
+
+class JsonOutput:
+    """Writes one JSON object per snapshot, one per line."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def write(self, state):
+        state = dict(state, time=time.time())
+        self.stream.write(json.dumps(state, separators=(",", ":")) + "\n")
+        self.stream.flush()
+
+
+class DebugMonitor:
+    """
+    Sends machine snapshots to an output at most `rate` times a second.
+
+    The frontend calls `update()` between frames, so a snapshot never sees a
+    half-executed instruction, and `update(force=True)` when pausing or
+    single-stepping. Nothing runs in the emulator loop unless a monitor has
+    been created.
+    """
+
+    def __init__(self, machine, output, rate=10):
+        self.machine = machine
+        self.output = output
+        self.interval = 1.0 / rate
+        self.last = None
+
+    def update(self, force=False):
+        now = time.perf_counter()
+        if not force and self.last is not None and now - self.last < self.interval:
+            return
+        self.last = now
+        self.output.write(snapshot(self.machine))
@@ -0,0 +1,157 @@
+from .decode import DecodeTable, opcode_pattern
+
+
+class BreakpointHit(Exception):
+    """
+    Raised out of step()/frame() before the instruction at `address` runs.
+    pc is left pointing at it, so execution can simply carry on.
+    """
+
+    def __init__(self, address, reason):
+        Exception.__init__(self, "%s at %03x" % (reason, address))
+        self.address = address
+        self.reason = reason
+
+
+class Debugger:
+    """
+    PC breakpoints, optionally conditional on machine state, and memory
+    watchpoints on the bytes Fx55 and Fx33 write and Fx65 and Dxyn read
+    (and, on XO-CHIP, that 5xy2 writes and 5xy3 and F002 read).
+
+    Checks live in an instrumented decode table that is only swapped into
+    the machine while something is armed. With only watchpoints armed, just
+    the memory opcodes are wrapped; breakpoints wrap everything. When
+    the last one is removed the machine's own table comes back and runs at
+    full speed. Only instructions going through the table are checked, so
+    debug on the interpreter rather than a BlockCache.
+    """
+
+    def __init__(self, machine):
+        self.machine = machine
+        self.breakpoints = {}
+        self.watchpoints = []
+        self.base = None
+        # Address of the last hit; it will not fire again until the
+        # instruction there has run and moved pc on.
+        self.resuming = None
+
+    def add_breakpoint(self, address, condition=None):
+        """Break at `address`, or only when `condition(machine)` is true there."""
+        self.breakpoints[address] = condition
+        self._rearm()
+
+    def remove_breakpoint(self, address):
+        self.breakpoints.pop(address, None)
+        self._rearm()
+
+    def add_watchpoint(self, start, end, kind="rw"):
+        """Break on reads ("r"), writes ("w") or both of memory[start:end]."""
+        self.watchpoints.append((start, end, kind))
+        self._rearm()
+
+    def remove_watchpoint(self, start, end, kind="rw"):
+        self.watchpoints.remove((start, end, kind))
+        self._rearm()
+
+    def clear(self):
+        self.breakpoints.clear()
+        del self.watchpoints[:]
+        self._rearm()
+
+    @property
+    def armed(self):
+        return bool(self.breakpoints or self.watchpoints)
+
+    def _rearm(self):
+        machine = self.machine
+        if self.base is not None:
+            machine.table = self.base
+            self.base = None
+        if self.armed:
+            self.base = machine.table
+            machine.table = DecodeTable(machine, self._decode)
+
+    def check(self, address, kind=None, start=0, length=0):
+        resuming = self.resuming
+        if resuming is not None:
+            if address == resuming:
+                return
+            self.resuming = None
+        machine = self.machine
+        reason = None
+        if address in self.breakpoints:
+            condition = self.breakpoints[address]
+            if condition is None or condition(machine):
+                reason = "breakpoint"
+        if reason is None and kind is not None:
+            end = start + length
+            for watch_start, watch_end, watch_kind in self.watchpoints:
+                if kind in watch_kind and start < watch_end and watch_start < end:
+                    reason = "%s watchpoint %03x-%03x" % (
+                        "read" if kind == "r" else "write",
+                        watch_start,
+                        watch_end,
+                    )
+                    break
+        if reason is not None:
+            machine.pc = address
+            self.resuming = address
+            raise BreakpointHit(address, reason)
+
+    def ran(self, address):
+        """Note that the instruction at `address` ran, so a hit there is over."""
+        if address == self.resuming and self.machine.pc != address:
+            self.resuming = None
+
+    def _decode(self, m, opcode):
+        handler = self.base.factory(m, opcode)
+        pattern = opcode_pattern(opcode, m.quirks.platform)
+        check = self.check
+        ran = self.ran
+        x = (opcode & 0x0F00) >> 8
+        y = (opcode & 0x00F0) >> 4
+        access = {
+            "Fx55": ("w", x + 1),
+            "Fx33": ("w", 3),
+            "Fx65": ("r", x + 1),
+            # As much as a draw on every plane reads.
+            "Dxyn": ("r", (opcode & 0x000F) * len(m.screen.planes)),
+            "Dxy0": ("r", 32 * len(m.screen.planes)),
+            "5xy2": ("w", abs(x - y) + 1),
+            "5xy3": ("r", abs(x - y) + 1),
+            "F002": ("r", 16),
+        }.get(pattern)
+        if access is None or not self.watchpoints:
+            if not self.breakpoints:
+                return handler
+
+            def debugged():
+                address = m.pc - 2
+                check(address)
+                handler()
+                ran(address)
+
+            return debugged
+        kind, length = access
+        if pattern in ("Dxyn", "Dxy0") and m.quirks.display_wait:
+
+            def debugged():
+                address = m.pc - 2
+                # Dxyn only reads memory when it actually draws.
+                if m.vblank:
+                    check(address, kind, m.index, length)
+                elif self.breakpoints:
+                    check(address)
+                handler()
+                ran(address)
+
+            return debugged
+
+        def debugged():
+            address = m.pc - 2
+            check(address, kind, m.index, length)
+            handler()
+            ran(address)
+
+        return debugged
@@ -0,0 +1,775 @@
+from operator import and_, or_, xor
+
+from .framebuffer import wide_lines
+from .idle import Idle, idle_period
+
+FONT_START = 0x50
+BIG_FONT_START = 0xA0  # SCHIP's 8x10 digits, after the 4x5 ones.
+SCREEN_WIDTH = 64
+SCREEN_HEIGHT = 32
+HIRES_WIDTH = 128
+HIRES_HEIGHT = 64
+
+
+class DecodeTable(dict):
+    """
+    Maps an opcode value to a handler already bound to one machine.
+
+    Handlers are built the first time an opcode is fetched, with x/y/n/nn/nnn
+    pulled out of the opcode up front, so dispatch is a single lookup and a
+    call. Keying on the opcode value rather than the address means code that
+    rewrites itself never needs the table to be flushed.
+    """
+
+    __slots__ = ("machine", "factory")
+
+    def __init__(self, machine, factory=None):
+        dict.__init__(self)
+        self.machine = machine
+        self.factory = factory or decode
+
+    def __missing__(self, opcode):
+        handler = self[opcode] = self.factory(self.machine, opcode)
+        return handler
+
+
+_patterns = {
+    0x1: "1nnn",
+    0x2: "2nnn",
+    0x3: "3xnn",
+    0x4: "4xnn",
+    0x5: "5xy0",
+    0x6: "6xnn",
+    0x7: "7xnn",
+    0x9: "9xy0",
+    0xA: "Annn",
+    0xB: "Bnnn",
+    0xC: "Cxnn",
+    0xD: "Dxyn",
+}
+_alu_patterns = {n: "8xy%X" % n for n in (0x0, 0x1, 0x2, 0x3, 0x4, 0x5, 0x6, 0x7, 0xE)}
+_key_patterns = {0x9E: "Ex9E", 0xA1: "ExA1"}
+_misc_patterns = {
+    nn: "Fx%02X" % nn for nn in (0x07, 0x0A, 0x15, 0x18, 0x1E, 0x29, 0x33, 0x55, 0x65)
+}
+_schip_misc_patterns = dict(_misc_patterns)
+_schip_misc_patterns.update({nn: "Fx%02X" % nn for nn in (0x30, 0x75, 0x85)})
+_xochip_misc_patterns = dict(_schip_misc_patterns)
+_xochip_misc_patterns.update({0x01: "Fn01", 0x3A: "Fx3A"})
+
+
+def opcode_pattern(opcode, platform="chip8"):
+    """
+    The opcode's class on `platform` as written in the handler docstrings,
+    e.g. "8xy4".
+    """
+    group = opcode >> 12
+    if platform != "chip8":
+        if group == 0x0:
+            if opcode & 0xFFF0 == 0x00C0:
+                return "00Cn"
+            if opcode & 0xFFF0 == 0x00D0 and platform == "xochip":
+                return "00Dn"
+            if 0x00FB <= opcode <= 0x00FF:
+                return "%04X" % opcode
+        elif group == 0xD and not opcode & 0x000F:
+            return "Dxy0"
+        elif group == 0xF:
+            if platform == "schip":
+                return _schip_misc_patterns.get(opcode & 0x00FF, "Fx??")
+            if opcode in (0xF000, 0xF002):
+                return "%04X" % opcode
+            return _xochip_misc_patterns.get(opcode & 0x00FF, "Fx??")
+        elif group == 0x5 and platform == "xochip" and opcode & 0x000F in (0x2, 0x3):
+            return "5xy%X" % (opcode & 0x000F)
+    if group == 0x0:
+        return {0x00E0: "00E0", 0x00EE: "00EE"}.get(opcode, "0nnn")
+    if group == 0x8:
+        return _alu_patterns.get(opcode & 0x000F, "8xy?")
+    if group == 0xE:
+        return _key_patterns.get(opcode & 0x00FF, "Ex??")
+    if group == 0xF:
+        return _misc_patterns.get(opcode & 0x00FF, "Fx??")
+    return _patterns[group]
+
+
+def read_memory(memory, index, count):
+    """`count` bytes from `index` on, wrapping past the end of memory."""
+    end = index + count
+    if end <= len(memory):
+        return memory[index:end]
+    mask = len(memory) - 1
+    return bytes(memory[(index + offset) & mask] for offset in range(count))
+
+
+def write_memory(memory, index, data):
+    """
+    Copy `data` into memory from `index` on, wrapping past the end of memory
+    so a store near the top never resizes it.
+    """
+    end = index + len(data)
+    if end <= len(memory):
+        memory[index:end] = data
+        return
+    mask = len(memory) - 1
+    for offset, value in enumerate(data):
+        memory[(index + offset) & mask] = value
+
+
+def _long_skip(m, handler):
+    """Wrap a skip for XO-CHIP, where skipping F000 nnnn skips all four bytes."""
+    memory = m.memory
+
+    def long_skip():
+        pc = m.pc
+        handler()
+        if m.pc != pc and memory[pc] == 0xF0 and not memory[pc + 1]:
+            m.pc += 2
+
+    long_skip.__doc__ = handler.__doc__
+    return long_skip
+
+
+def decode(m, opcode):
+    """Return a zero-argument handler that executes `opcode` on machine `m`."""
+    memory = m.memory
+    v = m.v
+    stack = m.stack
+    screen = m.screen
+    x = (opcode & 0x0F00) >> 8
+    y = (opcode & 0x00F0) >> 4
+    n = opcode & 0x000F
+    nn = opcode & 0x00FF
+    nnn = opcode & 0x0FFF
+    group = opcode >> 12
+    quirks = m.quirks
+    platform = quirks.platform
+
+    def skip(handler):
+        return _long_skip(m, handler) if platform == "xochip" else handler
+
+    if group == 0x0:
+        if opcode == 0x00E0:
+
+            def cls():
+                """
+                OPCODE: 0x00E0
+                FUNCTION: Clears the screen.
+                """
+                screen.clear()
+
+            return cls
+        if opcode == 0x00EE:
+
+            def ret():
+                """
+                OPCODE: 0x00EE
+                FUNCTION: Return from a sub-routine.
+                """
+                # A return with nothing on the stack wraps to its top
+                # entry, keeping sp in range for save states.
+                m.sp = (m.sp - 1) & 15
+                m.pc = stack[m.sp]
+
+            return ret
+        if platform != "chip8":
+            if opcode & 0xFFF0 == 0x00C0:
+
+                def scroll_down():
+                    """
+                    OPCODE: 0x00Cn
+                    FUNCTION: Scroll the screen down n rows.
+                    """
+                    screen.scroll_down(n)
+
+                return scroll_down
+            if opcode & 0xFFF0 == 0x00D0 and platform == "xochip":
+
+                def scroll_up():
+                    """
+                    OPCODE: 0x00Dn
+                    FUNCTION: Scroll the screen up n rows.
+                    """
+                    screen.scroll_up(n)
+
+                return scroll_up
+            if opcode == 0x00FB:
+
+                def scroll_right():
+                    """
+                    OPCODE: 0x00FB
+                    FUNCTION: Scroll the screen right 4 pixels.
+                    """
+                    screen.scroll_right(4)
+
+                return scroll_right
+            if opcode == 0x00FC:
+
+                def scroll_left():
+                    """
+                    OPCODE: 0x00FC
+                    FUNCTION: Scroll the screen left 4 pixels.
+                    """
+                    screen.scroll_left(4)
+
+                return scroll_left
+            if opcode == 0x00FD:
+
+                def halt():
+                    """
+                    OPCODE: 0x00FD
+                    FUNCTION: Exit the interpreter. The machine stays on this instruction from then on.
+                    """
+                    m.pc -= 2
+                    raise Idle(1)
+
+                return halt
+            if opcode == 0x00FE:
+
+                def low():
+                    """
+                    OPCODE: 0x00FE
+                    FUNCTION: Switch to the 64x32 low resolution and clear the screen.
+                    """
+                    screen.resize(SCREEN_WIDTH, SCREEN_HEIGHT)
+
+                return low
+            if opcode == 0x00FF:
+
+                def high():
+                    """
+                    OPCODE: 0x00FF
+                    FUNCTION: Switch to the 128x64 high resolution and clear the screen.
+                    """
+                    screen.resize(HIRES_WIDTH, HIRES_HEIGHT)
+
+                return high
+    elif group == 0x1:
+
+        def jp():
+            """
+            OPCODE: 0x1nnn
+            FUNCTION: Set program counter to nnn.
+            """
+            m.pc = nnn
+
+        return jp
+    elif group == 0x2:
+
+        def call():
+            """
+            OPCODE: 0x2nnn
+            FUNCTION: Call a subroutine at nnn.
+            """
+            stack[m.sp] = m.pc
+            m.sp += 1
+            m.pc = nnn
+
+        return call
+    elif group == 0x3:
+
+        def se_byte():
+            """
+            OPCODE: 0x3xnn
+            FUNCTION: if Vx == nn: Increment program counter by 2.
+            """
+            if v[x] == nn:
+                m.pc += 2
+
+        return skip(se_byte)
+    elif group == 0x4:
+
+        def sne_byte():
+            """
+            OPCODE: 0x4xnn
+            FUNCTION: if Vx != nn: Increment program counter by 2.
+            """
+            if v[x] != nn:
+                m.pc += 2
+
+        return skip(sne_byte)
+    elif group == 0x5:
+        if platform == "xochip" and n in (0x2, 0x3):
+            # Vx to Vy, counting down when x > y.
+            registers = slice(x, y + 1) if x <= y else slice(x, y - 1 if y else None, -1)
+            count = abs(x - y) + 1
+            if n == 0x2:
+
+                def save_range():
+                    """
+                    OPCODE: 0x5xy2
+                    FUNCTION: Store registers Vx through Vy in memory starting at location index.
+                    """
+                    index = m.index
+                    write_memory(memory, index, v[registers])
+
+                return save_range
+
+            def load_range():
+                """
+                OPCODE: 0x5xy3
+                FUNCTION: Read registers Vx through Vy from memory starting at location index.
+                """
+                index = m.index
+                v[registers] = read_memory(memory, index, count)
+
+            return load_range
+
+        def se_reg():
+            """
+            OPCODE: 0x5xy0
+            FUNCTION: if Vx == Vy: Increment program counter by 2.
+            """
+            if v[x] == v[y]:
+                m.pc += 2
+
+        return skip(se_reg)
+    elif group == 0x6:
+
+        def ld_byte():
+            """
+            OPCODE: 0x6xnn
+            FUNCTION: Set Vx to nn.
+            """
+            v[x] = nn
+
+        return ld_byte
+    elif group == 0x7:
+
+        def add_byte():
+            """
+            OPCODE: 0x7xnn
+            FUNCTION: Add nn to Vx, then set Vx to the sum.
+            """
+            v[x] = (v[x] + nn) & 0xFF
+
+        return add_byte
+    elif group == 0x8:
+        if n == 0x0:
+
+            def ld_reg():
+                """
+                OPCODE: 0x8xy0
+                FUNCTION: Set Vx to Vy.
+                """
+                v[x] = v[y]
+
+            return ld_reg
+        if n in (0x1, 0x2, 0x3) and not quirks.vf_reset:
+            operate = {0x1: or_, 0x2: and_, 0x3: xor}[n]
+
+            def logic_reg():
+                """
+                OPCODE: 0x8xy1, 0x8xy2, 0x8xy3
+                FUNCTION: OR, AND or XOR Vx with Vy, then set Vx to the output. VF is left alone.
+                """
+                v[x] = operate(v[x], v[y])
+
+            return logic_reg
+        if n == 0x1:
+
+            def or_reg():
+                """
+                OPCODE: 0x8xy1
+                FUNCTION: Perform bitwise OR operation on Vx and Vy, then set Vx to the output.
+                """
+                v[x] |= v[y]
+                v[0xF] = 0
+
+            return or_reg
+        if n == 0x2:
+
+            def and_reg():
+                """
+                OPCODE: 0x8xy2
+                FUNCTION: Perform a bitwise AND operation on Vx and Vy, then set Vx to the output.
+                """
+                v[x] &= v[y]
+                v[0xF] = 0
+
+            return and_reg
+        if n == 0x3:
+
+            def xor_reg():
+                """
+                OPCODE: 0x8xy3
+                FUNCTION: Perform a bitwise XOR operation on Vx and Vy, then set Vx to the output.
+                """
+                v[x] ^= v[y]
+                v[0xF] = 0
+
+            return xor_reg
+        if n == 0x4:
+
+            def add_reg():
+                """
+                OPCODE: 0x8xy4
+                FUNCTION: Add Vy to Vx, but if the result is greater than 255 (8 bits) then set VF to 1. Else 0.
+                """
+                added = v[x] + v[y]
+                v[x] = added & 0xFF
+                v[0xF] = added >> 8
+
+            return add_reg
+        if n == 0x5:
+
+            def sub_reg():
+                """
+                OPCODE: 0x8xy5
+                FUNCTION: If Vx >= Vy, then set VF to 1. Else 0. Then subtract Vy from Vx then set Vx to that.
+                """
+                flag = 1 if v[x] >= v[y] else 0
+                v[x] = (v[x] - v[y]) & 0xFF
+                v[0xF] = flag
+
+            return sub_reg
+        # Which register is shifted into Vx.
+        source = y if quirks.shift_vy else x
+        if n == 0x6:
+
+            def shr():
+                """
+                OPCODE: 0x8xy6
+                FUNCTION: If least significant bit of Vx is 1, then set  VF to 1. Else 0. Then divide Vx by 2.
+                """
+                flag = v[source] & 0x1
+                v[x] = v[source] >> 1
+                v[0xF] = flag
+
+            return shr
+        if n == 0x7:
+
+            def subn_reg():
+                """
+                OPCODE: 0x8xy7
+                FUNCTION: If Vy >= Vx, then set VF to 1. Else 0. Then subtract Vx from Vy then set Vx to that.
+                """
+                flag = 1 if v[y] >= v[x] else 0
+                v[x] = (v[y] - v[x]) & 0xFF
+                v[0xF] = flag
+
+            return subn_reg
+        if n == 0xE:
+
+            def shl():
+                """
+                OPCODE: 0x8xyE
+                FUNCTION: If most significant bit of Vx is 1, then set  VF to 1. Else 0. Then multiply Vx by 2.
+                """
+                flag = v[source] >> 7
+                v[x] = (v[source] << 1) & 0xFF
+                v[0xF] = flag
+
+            return shl
+    elif group == 0x9:
+
+        def sne_reg():
+            """
+            OPCODE: 0x9xy0
+            FUNCTION: Increment the program counter by 2 if Vx != Vy.
+            """
+            if v[x] != v[y]:
+                m.pc += 2
+
+        return skip(sne_reg)
+    elif group == 0xA:
+
+        def ld_index():
+            """
+            OPCODE: 0xAnnn
+            FUNCTION: Set index to nnn.
+            """
+            m.index = nnn
+
+        return ld_index
+    elif group == 0xB:
+        offset = x if quirks.jump_vx else 0
+
+        def jp_offset():
+            """
+            OPCODE: 0xBnnn
+            FUNCTION: Jump to location nnn + Vx
+            """
+            m.pc = nnn + v[offset]
+
+        return jp_offset
+    elif group == 0xC:
+        getrandbits = m.rng.getrandbits
+
+        def rnd():
+            """
+            OPCODE: 0xCxnn
+            FUNCTION: The interpreter generates a random number from 0 to 255, which is then ANDed with the value nn. The results are stored in Vx.
+            """
+            v[x] = getrandbits(8) & nn
+
+        return rnd
+    elif group == 0xD:
+        if platform != "chip8":
+            wait = quirks.display_wait
+            size = n or 32  # Bytes of sprite per plane.
+            wide = not n
+
+            def drw_planes():
+                """
+                OPCODE: 0xDxyn
+                FUNCTION: Display n-byte sprite, or a 16x16 one if n is 0, starting at memory location I at (Vx, Vy) on each selected plane, set VF = collision.
+                """
+                if wait and not m.vblank:
+                    m.pc -= 2
+                    raise Idle(1)
+                index = m.index
+                left = v[x] % screen.width
+                top = v[y] % screen.height
+                collision = 0
+                for rows in screen.selected:
+                    sprite = read_memory(memory, index, size)
+                    if wide:
+                        collision |= screen.blit(rows, left, top, wide_lines(sprite), 16)
+                    else:
+                        collision |= screen.blit(rows, left, top, sprite)
+                    index += size
+                v[0xF] = collision
+
+            return drw_planes
+        if not quirks.display_wait:
+
+            def drw_now():
+                """
+                OPCODE: 0xDxyn
+                FUNCTION: Display n-byte sprite starting at memory location I at (Vx, Vy), set VF = collision.
+                """
+                v[0xF] = screen.draw(
+                    v[x] % SCREEN_WIDTH, v[y] % SCREEN_HEIGHT, read_memory(memory, m.index, n)
+                )
+
+            return drw_now
+
+        def drw():
+            """
+            OPCODE: 0xDxyn
+            FUNCTION: Display n-byte sprite starting at memory location I at (Vx, Vy), set VF = collision.
+            Only draws on the first instruction of a frame, otherwise waits for it.
+            """
+            if not m.vblank:
+                m.pc -= 2
+                raise Idle(1)
+            v[0xF] = screen.draw(
+                v[x] % SCREEN_WIDTH, v[y] % SCREEN_HEIGHT, read_memory(memory, m.index, n)
+            )
+
+        return drw
+    elif group == 0xE:
+        if nn == 0x9E:
+
+            def skp():
+                """
+                OPCODE: 0xEx9E
+                FUNCTION: Increment the program counter by 2 if the key with the value of Vx is pressed.
+                """
+                if (m.keys >> (v[x] & 0xF)) & 1:
+                    m.pc += 2
+
+            return skip(skp)
+        if nn == 0xA1:
+
+            def sknp():
+                """
+                OPCODE: 0xExA1
+                FUNCTION: Incrememt the program counter by 2 if the key with the value of Vx is not currently pressed.
+                """
+                if not (m.keys >> (v[x] & 0xF)) & 1:
+                    m.pc += 2
+
+            return skip(sknp)
+    elif group == 0xF:
+        step = quirks.step(x)  # Added to I by Fx55 and Fx65.
+        if platform == "xochip":
+            if opcode == 0xF000:
+
+                def ld_long():
+                    """
+                    OPCODE: 0xF000 nnnn
+                    FUNCTION: Set index to the 16-bit address nnnn in the two bytes that follow.
+                    """
+                    pc = m.pc
+                    m.index = (memory[pc] << 8) | memory[pc + 1]
+                    m.pc = pc + 2
+
+                return ld_long
+            if nn == 0x01:
+
+                def plane():
+                    """
+                    OPCODE: 0xFn01
+                    FUNCTION: Select the bit-planes in mask n for drawing, clearing and scrolling.
+                    """
+                    screen.select(x)
+
+                return plane
+            if opcode == 0xF002:
+                pattern = m.pattern
+
+                def ld_pattern():
+                    """
+                    OPCODE: 0xF002
+                    FUNCTION: Load the 16-byte audio pattern from memory starting at location index.
+                    """
+                    index = m.index
+                    pattern[:] = read_memory(memory, index, 16)
+
+                return ld_pattern
+            if nn == 0x3A:
+
+                def ld_pitch():
+                    """
+                    OPCODE: 0xFx3A
+                    FUNCTION: Set the audio pitch to Vx.
+                    """
+                    m.pitch = v[x]
+
+                return ld_pitch
+        if platform != "chip8":
+            flags = m.flags
+            if nn == 0x30:
+
+                def ld_big_font():
+                    """
+                    OPCODE: 0xFx30
+                    FUNCTION: Set index to the location of the 8x10 sprite for digit Vx.
+                    """
+                    m.index = BIG_FONT_START + 10 * (v[x] & 0xF)
+
+                return ld_big_font
+            if nn == 0x75:
+
+                def store_flags():
+                    """
+                    OPCODE: 0xFx75
+                    FUNCTION: Store registers V0 through Vx in the RPL flags.
+                    """
+                    flags[: x + 1] = v[: x + 1]
+
+                return store_flags
+            if nn == 0x85:
+
+                def load_flags():
+                    """
+                    OPCODE: 0xFx85
+                    FUNCTION: Read registers V0 through Vx from the RPL flags.
+                    """
+                    v[: x + 1] = flags[: x + 1]
+
+                return load_flags
+        if nn == 0x07:
+
+            def ld_vx_dt():
+                """
+                OPCODE: Fx07
+                FUNCTION: Set Vx to the value of the delay timer.
+                """
+                v[x] = m.delay_timer
+                period = idle_period(m)
+                if period:
+                    raise Idle(period)
+
+            return ld_vx_dt
+        if nn == 0x0A:
+
+            def ld_key():
+                """
+                OPCODE: Fx0A
+                FUNCTION: Wait until a key is pressed and released then store the value in Vx
+                """
+                keys = m.keys
+                if keys:
+                    m.key_wait_index = (keys & -keys).bit_length() - 1
+                    m.key_wait = True
+                elif m.key_wait:
+                    v[x] = m.key_wait_index
+                    m.key_wait = False
+                    return
+                m.pc -= 2
+                raise Idle(1)
+
+            return ld_key
+        if nn == 0x15:
+
+            def ld_dt():
+                """
+                OPCODE: 0xFx15
+                FUNCTION: Set the delay timer to Vx
+                """
+                m.delay_timer = v[x]
+
+            return ld_dt
+        if nn == 0x18:
+
+            def ld_st():
+                """
+                OPCODE: 0xFx18
+                FUNCTION: Set the sound timer to Vx
+                """
+                m.sound_timer = v[x]
+
+            return ld_st
+        if nn == 0x1E:
+
+            def add_index():
+                """
+                OPCODE: 0xFx1E
+                FUNTION: Add I and Vx and store the result in I
+                """
+                m.index += v[x]
+
+            return add_index
+        if nn == 0x29:
+
+            def ld_font():
+                """
+                OPCODE: 0xFx29
+                FUNCTION: Set index to the location of sprite for digit Vx.
+                """
+                m.index = FONT_START + (5 * v[x])
+
+            return ld_font
+        if nn == 0x33:
+
+            def bcd():
+                """
+                OPCODE: 0xFx33
+                FUNCTION: Store BCD representation of Vx in memory locations index, index + 1, and index + 2.
+                """
+                value = v[x]
+                write_memory(memory, m.index, (value // 100, (value // 10) % 10, value % 10))
+
+            return bcd
+        if nn == 0x55:
+
+            def store():
+                """
+                OPCODE: 0xFx55
+                FUNCTION: Store registers V0 through Vx in memory starting at location index.
+                """
+                index = m.index
+                write_memory(memory, index, v[: x + 1])
+                m.index = index + step
+
+            return store
+        if nn == 0x65:
+
+            def load():
+                """
+                OPCODE: 0xFx65
+                FUNCTION: Read registers V0 through Vx from memory starting at location index.
+                """
+                index = m.index
+                v[: x + 1] = read_memory(memory, index, x + 1)
+                m.index = index + step
+
+            return load
+
+    def nop():
+        """Opcodes the interpreter does not know are skipped."""
+
+    return nop
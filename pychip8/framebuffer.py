@@ -0,0 +1,151 @@
+import sys
+from array import array
+
+
+def wide_lines(sprite):
+    """The rows of a 16-pixel-wide sprite, two big-endian bytes each, as ints."""
+    lines = array("H", sprite[: len(sprite) & ~1])
+    if sys.byteorder == "little":
+        lines.byteswap()
+    return lines
+
+
+class Framebuffer:
+    """
+    A display of one or more bit-planes, each packed one Python int per row.
+
+    Bit (width - 1 - x) of `rows[y]` is the pixel at (x, y), so the leftmost
+    pixel is the most significant bit and a sprite byte lines up with a
+    single shift. `planes` holds a list of rows per plane and `rows` is the
+    first of them; a pixel's colour is the number made of its bit in each
+    plane. Drawing, clearing and scrolling apply to the `selected` planes.
+
+    `dirty` is a bitmask of rows changed since a renderer last cleared it.
+    """
+
+    __slots__ = ("width", "height", "planes", "rows", "selected", "mask", "blank", "dirty", "all_rows")
+
+    def __init__(self, width=64, height=32, planes=1):
+        self.planes = [[] for _ in range(planes)]
+        self.rows = self.planes[0]
+        self.select(1)
+        self.resize(width, height)
+
+    def resize(self, width, height):
+        """Change the resolution, clearing every plane. The row lists are kept."""
+        self.width = width
+        self.height = height
+        self.blank = (0,) * height
+        for rows in self.planes:
+            rows[:] = self.blank
+        self.all_rows = (1 << height) - 1
+        self.dirty = self.all_rows
+
+    def select(self, mask):
+        """Draw, clear and scroll the planes whose bits are set in `mask`."""
+        self.mask = mask
+        self.selected = [rows for plane, rows in enumerate(self.planes) if (mask >> plane) & 1]
+
+    def clear(self):
+        for rows in self.selected:
+            rows[:] = self.blank
+        self.dirty = self.all_rows
+
+    def draw(self, x, y, sprite):
+        """
+        XOR 8-pixel-wide `sprite` rows onto the screen with the top left at
+        (x, y), clipping at the right and bottom edges. Returns 1 if any lit
+        pixel was turned off, else 0.
+        """
+        rows = self.rows
+        shift = self.width - 8 - x
+        collision = 0
+        sprite = sprite[: self.height - y]
+        self.dirty |= ((1 << len(sprite)) - 1) << y
+        for line in sprite:
+            bits = line << shift if shift >= 0 else line >> -shift
+            row = rows[y]
+            if row & bits:
+                collision = 1
+            rows[y] = row ^ bits
+            y += 1
+        return collision
+
+    def blit(self, rows, x, y, lines, span=8):
+        """`draw` onto the plane `rows` with `lines` of `span` pixels each."""
+        shift = self.width - span - x
+        collision = 0
+        lines = lines[: self.height - y]
+        self.dirty |= ((1 << len(lines)) - 1) << y
+        for line in lines:
+            bits = line << shift if shift >= 0 else line >> -shift
+            row = rows[y]
+            if row & bits:
+                collision = 1
+            rows[y] = row ^ bits
+            y += 1
+        return collision
+
+    def scroll_down(self, n):
+        if n:
+            keep = self.height - n
+            for rows in self.selected:
+                rows[n:] = rows[:keep]
+                rows[:n] = self.blank[:n]
+            self.dirty = self.all_rows
+
+    def scroll_up(self, n):
+        if n:
+            keep = self.height - n
+            for rows in self.selected:
+                rows[:keep] = rows[n:]
+                rows[keep:] = self.blank[:n]
+            self.dirty = self.all_rows
+
+    def scroll_left(self, n):
+        mask = (1 << self.width) - 1
+        for rows in self.selected:
+            rows[:] = [(row << n) & mask for row in rows]
+        self.dirty = self.all_rows
+
+    def scroll_right(self, n):
+        for rows in self.selected:
+            rows[:] = [row >> n for row in rows]
+        self.dirty = self.all_rows
+
+    def pixel(self, x, y):
+        return (self.rows[y] >> (self.width - 1 - x)) & 1
+
+    def tobytes(self):
+        """The rows packed big-endian, width // 8 bytes each, plane after plane."""
+        size = self.width // 8
+        if size == 8:
+            packed = array("Q", self.rows)
+            for rows in self.planes[1:]:
+                packed.extend(rows)
+            if sys.byteorder == "little":
+                packed.byteswap()
+            return packed.tobytes()
+        return b"".join(row.to_bytes(size, "big") for rows in self.planes for row in rows)
+
+    def frombytes(self, data):
+        """Replace the rows in place from the layout `tobytes` produces."""
+        size = self.width // 8
+        height = self.height
+        if size == 8:
+            packed = array("Q")
+            packed.frombytes(data)
+            if sys.byteorder == "little":
+                packed.byteswap()
+            for plane, rows in enumerate(self.planes):
+                rows[:] = packed[plane * height : (plane + 1) * height]
+            self.dirty = self.all_rows
+            return
+        data = memoryview(data)
+        for plane, rows in enumerate(self.planes):
+            start = plane * size * height
+            rows[:] = [
+                int.from_bytes(data[offset : offset + size], "big")
+                for offset in range(start, start + size * height, size)
+            ]
+        self.dirty = self.all_rows
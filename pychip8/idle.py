@@ -0,0 +1,76 @@
+IDLE_LIMIT = 8  # Longest loop, in instructions, recognised as idle.
+
+
+class Idle(Exception):
+    """
+    Raised by a handler, after it has completed, when the machine is parked
+    in a loop of `period` instructions that cannot leave before the next
+    timer tick or key change. Engines skip the whole turns of the loop left
+    in the frame; the state they would have produced is the one they have.
+    """
+
+    def __init__(self, period):
+        Exception.__init__(self, period)
+        self.period = period
+
+
+def pure(opcode):
+    """
+    True for opcodes that only read registers, the delay timer and the keys,
+    and only write registers and pc: 1nnn, the skips, 6xnn and Fx07.
+    """
+    group = opcode >> 12
+    if group in (0x1, 0x3, 0x4, 0x6):
+        return True
+    if group in (0x5, 0x9):
+        return not opcode & 0x000F
+    if group == 0xE:
+        return opcode & 0x00FF in (0x9E, 0xA1)
+    return opcode & 0xF0FF == 0xF007
+
+
+def idle_period(machine, limit=IDLE_LIMIT):
+    """
+    The length of the loop the machine is idling in from pc, or 0 if it is
+    not. The loop is followed on a copy of the registers using only pure
+    opcodes; it is idle if it comes back to pc with them unchanged, since
+    nothing it reads can change until the frame ends.
+    """
+    memory = machine.memory
+    v = bytearray(machine.v)
+    keys = machine.keys
+    # XO-CHIP skips step over both words of F000 nnnn.
+    long_skips = machine.quirks.platform == "xochip"
+    start = pc = machine.pc
+    for count in range(1, limit + 1):
+        if pc + 3 >= len(memory):
+            return 0
+        opcode = (memory[pc] << 8) | memory[pc + 1]
+        if not pure(opcode):
+            return 0
+        pc += 2
+        group = opcode >> 12
+        x = (opcode & 0x0F00) >> 8
+        nn = opcode & 0x00FF
+        skip = False
+        if group == 0x1:
+            pc = opcode & 0x0FFF
+        elif group == 0x3:
+            skip = v[x] == nn
+        elif group == 0x4:
+            skip = v[x] != nn
+        elif group == 0x5:
+            skip = v[x] == v[(opcode & 0x00F0) >> 4]
+        elif group == 0x9:
+            skip = v[x] != v[(opcode & 0x00F0) >> 4]
+        elif group == 0x6:
+            v[x] = nn
+        elif group == 0xE:
+            skip = ((keys >> (v[x] & 0xF)) & 1) == (nn == 0x9E)
+        else:
+            v[x] = machine.delay_timer
+        if skip:
+            pc += 4 if long_skips and memory[pc] == 0xF0 and not memory[pc + 1] else 2
+        if pc == start:
+            return count if v == machine.v else 0
+    return 0
@@ -0,0 +1,132 @@
+import struct
+
+# Keyboard keys for Chip8 keys 0x0 to 0xF, as pygame K_ names.
+KEYMAP = ("x", "1", "2", "3", "q", "w", "e", "a", "s", "d", "z", "c", "4", "r", "f", "v")
+
+KEY_LOG_MAGIC = b"C8KEYS"
+KEY_LOG_VERSION = 1
+_header = struct.Struct("<6sBI")
+_change = struct.Struct("<IH")
+
+
+class InputSource:
+    """
+    Where key state comes from. `poll(frame)` is called once per frame and
+    returns the 16-bit key mask for that frame (bit n set while key n is
+    held); the machine reads that mask directly for Ex9E, ExA1 and Fx0A.
+    """
+
+    quit = False
+
+    def poll(self, frame):
+        return 0
+
+
+class ScriptedInput(InputSource):
+    """Plays back a list of (frame, mask) changes, holding each mask until the next."""
+
+    def __init__(self, changes):
+        self.changes = sorted(changes)
+        self.position = 0
+        self.mask = 0
+
+    def poll(self, frame):
+        changes = self.changes
+        position = self.position
+        while position < len(changes) and changes[position][0] <= frame:
+            self.mask = changes[position][1]
+            position += 1
+        self.position = position
+        return self.mask
+
+
+class ReplayInput(ScriptedInput):
+    """Plays back a key log written by `save_key_log`."""
+
+    def __init__(self, path):
+        ScriptedInput.__init__(self, load_key_log(path))
+
+
+class PygameInput(InputSource):
+    """
+    Keyboard input from pygame events. Key state is only updated from
+    KEYDOWN/KEYUP events, once per poll, instead of polling the keyboard.
+
+    Keys in `controls` are not passed to the machine; their names are queued
+    in `commands` for the frontend when pressed and kept in `held` while
+    down (pause, single-step and rewind by default).
+    """
+
+    def __init__(
+        self,
+        keymap=KEYMAP,
+        controls=(("SPACE", "pause"), ("n", "step"), ("BACKSPACE", "rewind")),
+    ):
+        import pygame
+
+        self.pygame = pygame
+        self.bits = {getattr(pygame, "K_" + name): bit for bit, name in enumerate(keymap)}
+        self.controls = {getattr(pygame, "K_" + name): command for name, command in controls}
+        self.mask = 0
+        self.commands = []
+        self.held = set()
+        self.quit = False
+
+    def handle(self, event):
+        pygame = self.pygame
+        if event.type == pygame.KEYDOWN:
+            if event.key in self.bits:
+                self.mask |= 1 << self.bits[event.key]
+            elif event.key in self.controls:
+                self.commands.append(self.controls[event.key])
+                self.held.add(self.controls[event.key])
+        elif event.type == pygame.KEYUP:
+            if event.key in self.bits:
+                self.mask &= ~(1 << self.bits[event.key])
+            elif event.key in self.controls:
+                self.held.discard(self.controls[event.key])
+        elif event.type == pygame.WINDOWFOCUSLOST:
+            # Key-up events are not delivered while unfocused.
+            self.mask = 0
+            self.held.clear()
+        elif event.type == pygame.QUIT:
+            self.quit = True
+
+    def poll(self, frame):
+        for event in self.pygame.event.get():
+            self.handle(event)
+        return self.mask
+
+    def wait(self):
+        """Block until at least one event arrives, then handle everything queued."""
+        self.handle(self.pygame.event.wait())
+        self.poll(None)
+
+
+def save_key_log(path, changes):
+    """Write (frame, mask) changes as a compact binary key log."""
+    with open(path, "wb") as f:
+        write_key_log(f, changes)
+
+
+def write_key_log(f, changes):
+    changes = list(changes)
+    f.write(_header.pack(KEY_LOG_MAGIC, KEY_LOG_VERSION, len(changes)))
+    f.write(b"".join(_change.pack(frame, mask) for frame, mask in changes))
+
+
+def load_key_log(path):
+    with open(path, "rb") as f:
+        return read_key_log(f)
+
+
+def read_key_log(f):
+    magic, version, count = _header.unpack(f.read(_header.size))
+    if magic != KEY_LOG_MAGIC:
+        raise ValueError("not a Chip8 key log")
+    if version != KEY_LOG_VERSION:
+        raise ValueError("unsupported key log version %d" % version)
+    data = f.read(_change.size * count)
+    if len(data) != _change.size * count:
+        raise ValueError("truncated key log")
+    return list(_change.iter_unpack(data))
@@ -0,0 +1,449 @@
+from .decode import (
+    BIG_FONT_START,
+    FONT_START,
+    HIRES_HEIGHT,
+    HIRES_WIDTH,
+    SCREEN_HEIGHT,
+    SCREEN_WIDTH,
+    DecodeTable,
+    decode,
+    read_memory,
+    write_memory,
+)
+from .idle import idle_period, pure
+
+PAGE_SHIFT = 6  # Code is tracked in 64-byte pages for invalidation.
+MAX_BLOCK = 64
+
+
+def _store_length(opcode, platform="chip8"):
+    """Bytes written by a store opcode, or 0 if it does not write memory."""
+    if opcode & 0xF0FF == 0xF033:
+        return 3
+    if opcode & 0xF0FF == 0xF055:
+        return ((opcode & 0x0F00) >> 8) + 1
+    if platform == "xochip" and opcode & 0xF00F == 0x5002:
+        return abs(((opcode & 0x0F00) >> 8) - ((opcode & 0x00F0) >> 4)) + 1
+    return 0
+
+
+def _translate(opcode, address, quirks):
+    """
+    Return (lines, ends_block) for one instruction under `quirks`, or None
+    when it has to go through the interpreter (Dxyn and Fx0A wait on the
+    frame and the keypad, 00FD parks the machine).
+    """
+    x = (opcode & 0x0F00) >> 8
+    y = (opcode & 0x00F0) >> 4
+    n = opcode & 0x000F
+    nn = opcode & 0x00FF
+    nnn = opcode & 0x0FFF
+    group = opcode >> 12
+    following = address + 2
+    platform = quirks.platform
+    skipped = str(following + 2)
+    if platform == "xochip":
+        # Skipping F000 nnnn skips both of its words.
+        skipped = "(%d if memory[%d] == 240 and not memory[%d] else %d)" % (
+            following + 4,
+            following,
+            following + 1,
+            following + 2,
+        )
+
+    if group == 0x0:
+        if opcode == 0x00E0:
+            return ["screen.clear()"], False
+        if opcode == 0x00EE:
+            return ["m.sp = (m.sp - 1) & 15", "m.pc = stack[m.sp]"], True
+        if platform != "chip8":
+            if opcode & 0xFFF0 == 0x00C0:
+                return ["screen.scroll_down(%d)" % n], False
+            if opcode & 0xFFF0 == 0x00D0 and platform == "xochip":
+                return ["screen.scroll_up(%d)" % n], False
+            if opcode == 0x00FB:
+                return ["screen.scroll_right(4)"], False
+            if opcode == 0x00FC:
+                return ["screen.scroll_left(4)"], False
+            if opcode == 0x00FD:
+                return None
+            if opcode == 0x00FE:
+                return ["screen.resize(%d, %d)" % (SCREEN_WIDTH, SCREEN_HEIGHT)], False
+            if opcode == 0x00FF:
+                return ["screen.resize(%d, %d)" % (HIRES_WIDTH, HIRES_HEIGHT)], False
+        return ["pass"], False
+    if group == 0x1:
+        return ["m.pc = %d" % nnn], True
+    if group == 0x2:
+        return ["stack[m.sp] = %d" % following, "m.sp += 1", "m.pc = %d" % nnn], True
+    if group == 0x5 and platform == "xochip" and n in (0x2, 0x3):
+        count = abs(x - y) + 1
+        registers = "%d:%d" % (x, y + 1) if x <= y else "%d:%s:-1" % (x, y - 1 if y else "")
+        if n == 0x2:
+            return [
+                "i = m.index",
+                "write_memory(memory, i, v[%s])" % registers,
+                "written(i, i + %d)" % count,
+                "m.pc = %d" % following,
+            ], True
+        return ["i = m.index", "v[%s] = read_memory(memory, i, %d)" % (registers, count)], False
+    if group in (0x3, 0x4, 0x5, 0x9):
+        condition = {
+            0x3: "v[%d] == %d" % (x, nn),
+            0x4: "v[%d] != %d" % (x, nn),
+            0x5: "v[%d] == v[%d]" % (x, y),
+            0x9: "v[%d] != v[%d]" % (x, y),
+        }[group]
+        return ["m.pc = %s if %s else %d" % (skipped, condition, following)], True
+    if group == 0x6:
+        return ["v[%d] = %d" % (x, nn)], False
+    if group == 0x7:
+        return ["v[%d] = (v[%d] + %d) & 255" % (x, x, nn)], False
+    if group == 0x8:
+        if n == 0x0:
+            return ["v[%d] = v[%d]" % (x, y)], False
+        if n in (0x1, 0x2, 0x3):
+            operator = {0x1: "|", 0x2: "&", 0x3: "^"}[n]
+            lines = ["v[%d] %s= v[%d]" % (x, operator, y)]
+            if quirks.vf_reset:
+                lines.append("v[15] = 0")
+            return lines, False
+        if n == 0x4:
+            return [
+                "t = v[%d] + v[%d]" % (x, y),
+                "v[%d] = t & 255" % x,
+                "v[15] = t >> 8",
+            ], False
+        if n == 0x5:
+            return [
+                "f = 1 if v[%d] >= v[%d] else 0" % (x, y),
+                "v[%d] = (v[%d] - v[%d]) & 255" % (x, x, y),
+                "v[15] = f",
+            ], False
+        source = y if quirks.shift_vy else x
+        if n == 0x6:
+            return ["f = v[%d] & 1" % source, "v[%d] = v[%d] >> 1" % (x, source), "v[15] = f"], False
+        if n == 0x7:
+            return [
+                "f = 1 if v[%d] >= v[%d] else 0" % (y, x),
+                "v[%d] = (v[%d] - v[%d]) & 255" % (x, y, x),
+                "v[15] = f",
+            ], False
+        if n == 0xE:
+            return ["f = v[%d] >> 7" % source, "v[%d] = (v[%d] << 1) & 255" % (x, source), "v[15] = f"], False
+        return ["pass"], False
+    if group == 0xA:
+        return ["m.index = %d" % nnn], False
+    if group == 0xB:
+        return ["m.pc = %d + v[%d]" % (nnn, x if quirks.jump_vx else 0)], True
+    if group == 0xC:
+        return ["v[%d] = getrandbits(8) & %d" % (x, nn)], False
+    if group == 0xD:
+        return None
+    if group == 0xE:
+        if nn == 0x9E:
+            return ["m.pc = %s if (m.keys >> (v[%d] & 15)) & 1 else %d" % (skipped, x, following)], True
+        if nn == 0xA1:
+            return ["m.pc = %s if not (m.keys >> (v[%d] & 15)) & 1 else %d" % (skipped, x, following)], True
+        return ["pass"], False
+    if platform == "xochip":
+        if opcode == 0xF000:
+            # The address is read at run time, in case the code rewrites it.
+            return [
+                "m.index = (memory[%d] << 8) | memory[%d]" % (following, following + 1),
+                "m.pc = %d" % (following + 2),
+            ], True
+        if nn == 0x01:
+            return ["screen.select(%d)" % x], False
+        if opcode == 0xF002:
+            return ["i = m.index", "pattern[:] = read_memory(memory, i, 16)"], False
+        if nn == 0x3A:
+            return ["m.pitch = v[%d]" % x], False
+    if platform != "chip8":
+        if nn == 0x30:
+            return ["m.index = %d + 10 * (v[%d] & 15)" % (BIG_FONT_START, x)], False
+        if nn == 0x75:
+            return ["flags[:%d] = v[:%d]" % (x + 1, x + 1)], False
+        if nn == 0x85:
+            return ["v[:%d] = flags[:%d]" % (x + 1, x + 1)], False
+    if nn == 0x07:
+        return ["v[%d] = m.delay_timer" % x], False
+    if nn == 0x0A:
+        return None
+    if nn == 0x15:
+        return ["m.delay_timer = v[%d]" % x], False
+    if nn == 0x18:
+        return ["m.sound_timer = v[%d]" % x], False
+    if nn == 0x1E:
+        return ["m.index += v[%d]" % x], False
+    if nn == 0x29:
+        return ["m.index = %d + 5 * v[%d]" % (FONT_START, x)], False
+    if nn == 0x33:
+        # Stores end the block so a block that rewrites itself is re-read.
+        return [
+            "i = m.index",
+            "write_memory(memory, i, (v[%d] // 100, (v[%d] // 10) %% 10, v[%d] %% 10))" % (x, x, x),
+            "written(i, i + 3)",
+            "m.pc = %d" % following,
+        ], True
+    if nn == 0x55:
+        return [
+            "i = m.index",
+            "write_memory(memory, i, v[:%d])" % (x + 1),
+            "m.index = i + %d" % quirks.step(x),
+            "written(i, i + %d)" % (x + 1),
+            "m.pc = %d" % following,
+        ], True
+    if nn == 0x65:
+        return [
+            "i = m.index",
+            "v[:%d] = read_memory(memory, i, %d)" % (x + 1, x + 1),
+            "m.index = i + %d" % quirks.step(x),
+        ], False
+    return ["pass"], False
+
+
+class Block:
+    __slots__ = ("start", "end", "length", "run", "source", "waits")
+
+    def __init__(self, start, end, length, run, source, waits=False):
+        self.start = start
+        self.end = end
+        self.length = length
+        self.run = run
+        self.source = source
+        # Reads the delay timer and nothing impure: may be part of an idle loop.
+        self.waits = waits
+
+
+class BlockCache:
+    """
+    Runs a machine by translating straight-line runs of instructions into
+    Python functions, cached by start address.
+
+    A block ends at any jump, skip, call or return, after a store, and before
+    Dxyn, Fx0A or 00FD, which still go through the machine's own handlers. Each
+    block takes the number of instructions left in the frame and stops early
+    when it runs out, so frames, timers and the display wait line up exactly
+    with `Chip8.frame()`.
+
+    Stores made by Fx55 and Fx33, from blocks or from the interpreter,
+    invalidate any block covering the written bytes. Anything else that
+    writes memory behind the cache's back (load_rom, load_state), switching
+    the machine's quirks and `reset()`, which replaces the machine's
+    memory, registers and decode table, must be followed by `clear()`.
+    """
+
+    def __init__(self, machine):
+        self.machine = machine
+        self.blocks = {}
+        self.pages = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._bind()
+
+    def _bind(self):
+        """Point the generated code and the machine's table at its current state."""
+        machine = self.machine
+        self.namespace = {
+            "m": machine,
+            "v": machine.v,
+            "memory": machine.memory,
+            "stack": machine.stack,
+            "getrandbits": machine.rng.getrandbits,
+            "written": self.written,
+            "screen": machine.screen,
+            "flags": machine.flags,
+            "pattern": machine.pattern,
+            "read_memory": read_memory,
+            "write_memory": write_memory,
+        }
+        if machine.table.factory is decode:
+            machine.table = DecodeTable(machine, self._decode)
+
+    def _decode(self, machine, opcode):
+        handler = decode(machine, opcode)
+        length = _store_length(opcode, machine.quirks.platform)
+        if not length:
+            return handler
+        written = self.written
+
+        def store():
+            index = machine.index
+            handler()
+            written(index, index + length)
+
+        return store
+
+    def stats(self):
+        return {
+            "blocks": len(self.blocks),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+    def clear(self):
+        """Drop every block and pick up whatever the machine's state is now."""
+        self.blocks.clear()
+        self.pages.clear()
+        self._bind()
+
+    def written(self, start, end):
+        """Drop every block that overlaps memory[start:end]."""
+        size = len(self.machine.memory)
+        if end > size:
+            # Stores wrap past the end of memory.
+            count = end - start
+            start &= size - 1
+            end = start + count
+            if end > size:
+                self.written(0, end - size)
+                end = size
+        pages = self.pages
+        first = start >> PAGE_SHIFT
+        last = (end - 1) >> PAGE_SHIFT
+        if first not in pages and last not in pages:
+            return
+        for page in range(first, last + 1):
+            for address in list(pages.get(page, ())):
+                block = self.blocks.get(address)
+                if block is not None and block.start < end and start < block.end:
+                    self._drop(block)
+
+    def _drop(self, block):
+        del self.blocks[block.start]
+        for page in range(block.start >> PAGE_SHIFT, ((block.end - 1) >> PAGE_SHIFT) + 1):
+            starts = self.pages[page]
+            starts.discard(block.start)
+            if not starts:
+                del self.pages[page]
+        self.invalidations += 1
+
+    def compile(self, start):
+        """
+        Translate the block at `start`. A block that would be empty (the
+        instruction at `start` is Dxyn or Fx0A) is cached with `run` set to
+        None so the interpreter handles it.
+        """
+        memory = self.machine.memory
+        instructions = []
+        address = start
+        ends_block = False
+        while not ends_block and len(instructions) < MAX_BLOCK and address + 1 < len(memory):
+            opcode = (memory[address] << 8) | memory[address + 1]
+            translated = _translate(opcode, address, self.machine.quirks)
+            if translated is None:
+                break
+            lines, ends_block = translated
+            instructions.append((address, opcode, lines))
+            address += 2
+        length = len(instructions)
+        if not length:
+            block = Block(start, start + 2, 0, None, "")
+        else:
+            if instructions[-1][1] == 0x1000 | start:
+                body = self._loop_body(start, instructions)
+            else:
+                body = self._checked_body(instructions, "budget", str(length))
+                if not ends_block:
+                    body.insert(-1, "m.pc = %d" % address)
+            name = "block_%03x" % start
+            source = "def %s(budget):\n    %s\n" % (name, "\n    ".join(body))
+            exec(compile(source, "<%s>" % name, "exec"), self.namespace)
+            opcodes = [opcode for _, opcode, _ in instructions]
+            waits = all(map(pure, opcodes)) and any(opcode & 0xF0FF == 0xF007 for opcode in opcodes)
+            block = Block(start, address, length, self.namespace.pop(name), source, waits)
+        self.blocks[start] = block
+        for page in range(start >> PAGE_SHIFT, ((block.end - 1) >> PAGE_SHIFT) + 1):
+            self.pages.setdefault(page, set()).add(start)
+        return block
+
+    @staticmethod
+    def _checked_body(instructions, budget, result):
+        """Straight-line code that stops as soon as `budget` runs out."""
+        body = []
+        for count, (address, _, lines) in enumerate(instructions):
+            if count:
+                body.append("if %s == %d:" % (budget, count))
+                body.append("    m.pc = %d" % address)
+                body.append("    return %s" % (result if budget != "budget" else count))
+            body.extend(lines)
+        body.append("return %s" % result)
+        return body
+
+    @classmethod
+    def _loop_body(cls, start, instructions):
+        """
+        A block that ends by jumping back to its own start runs whole
+        iterations in a Python loop, then whatever part of one still fits.
+        """
+        length = len(instructions)
+        body = ["for _ in range(budget // %d):" % length]
+        body.extend("    " + line for _, _, lines in instructions[:-1] for line in lines)
+        if length == 1:
+            body.append("    pass")
+        body.append("left = budget %% %d" % length)
+        body.append("if not left:")
+        body.append("    m.pc = %d" % start)
+        body.append("    return budget")
+        # With less than a whole iteration left the jump itself is never reached.
+        body.extend(cls._checked_body(instructions[:-1], "left", "budget")[:-1])
+        body.append("m.pc = %d" % instructions[-1][0])
+        body.append("return budget")
+        return body
+
+    def execute(self, budget):
+        """Run `budget` instructions without ticking the timers."""
+        m = self.machine
+        blocks = self.blocks
+        hits = 0
+        while budget:
+            block = blocks.get(m.pc)
+            if block is None:
+                self.misses += 1
+                block = self.compile(m.pc)
+            else:
+                hits += 1
+            if block.run is None:
+                # Dxyn and Fx0A leave pc alone while they wait, and will
+                # keep waiting for the rest of the frame.
+                m.execute()
+                budget -= 1
+                if m.pc == block.start:
+                    budget = 0
+            else:
+                budget -= block.run(budget)
+                m.vblank = False
+                if block.waits and budget:
+                    period = idle_period(m)
+                    if period:
+                        budget %= period
+        self.hits += hits
+
+    def frame(self):
+        """Run the rest of the 60 Hz frame, the same as `Chip8.frame()`."""
+        m = self.machine
+        done = m.frame_cycle
+        m.frame_cycle = 0
+        if done < m.ipf:
+            m.vblank = not done
+            self.execute(m.ipf - done)
+        m.tick_timers()
+
+    def run(self, cycles):
+        """
+        Run `cycles` instructions, as whole frames where possible. Part
+        frames are stepped through the machine's table.
+        """
+        m = self.machine
+        while cycles and m.frame_cycle:
+            m.step()
+            cycles -= 1
+        frames, rest = divmod(cycles, m.ipf)
+        frame = self.frame
+        for _ in range(frames):
+            frame()
+        for _ in range(rest):
+            m.step()
@@ -0,0 +1,209 @@
+"""
+Load test for pychip8.server: how many sessions one core can keep at 60 Hz.
+
+    python -m pychip8.loadtest --rom testroms/test_opcode.ch8
+    python -m pychip8.loadtest --port 8564 --sessions 50,100,200
+
+With --rom a server is started in a child process for the duration.
+Clients connect in steps of increasing session counts, apply every frame
+to a local copy of the screen and press random keys now and then. For
+each step the received frame rate and the server's CPU use (from its stats
+message) are reported; a step is sustained if clients average at least
+95% of 60 frames a second. Sessions per core is the largest sustained step
+divided by the fraction of a core the server used for it.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from .framebuffer import Framebuffer
+from .quirks import PROFILES
+from .scheduler import TIMER_HZ
+from .server import HELLO_MAGIC, frame_header, hello, keys_message, resize_message, stats_header
+
+SUSTAINED = 0.95
+
+
+class Client:
+    def __init__(self, reader, writer, width, height, planes, seed):
+        self.reader = reader
+        self.writer = writer
+        self.screen = Framebuffer(width, height, planes)
+        self.frames = 0
+        self.rng = random.Random(seed)
+        self.stats = None
+
+    @classmethod
+    async def connect(cls, address, port, unix, seed):
+        if unix:
+            reader, writer = await asyncio.open_unix_connection(unix)
+        else:
+            reader, writer = await asyncio.open_connection(address, port)
+        magic, _, width, height, planes = hello.unpack(await reader.readexactly(hello.size))
+        if magic != HELLO_MAGIC:
+            raise ValueError("not a pychip8 server")
+        return cls(reader, writer, width, height, planes, seed)
+
+    async def run(self):
+        reader = self.reader
+        screen = self.screen
+        planes = screen.planes
+        try:
+            while True:
+                kind = await reader.readexactly(1)
+                if kind == b"S":
+                    _, length = stats_header.unpack(kind + await reader.readexactly(stats_header.size - 1))
+                    self.stats.set_result(json.loads(await reader.readexactly(length)))
+                    continue
+                if kind == b"R":
+                    _, width, height = resize_message.unpack(kind + await reader.readexactly(resize_message.size - 1))
+                    screen.resize(width, height)
+                    continue
+                size = screen.width // 8
+                _, _, dirty = frame_header.unpack(kind + await reader.readexactly(frame_header.size - 1))
+                data = await reader.readexactly(bin(dirty).count("1") * size * len(planes))
+                offset = 0
+                while dirty:
+                    y = (dirty & -dirty).bit_length() - 1
+                    dirty &= dirty - 1
+                    for rows in planes:
+                        rows[y] = int.from_bytes(data[offset : offset + size], "big")
+                        offset += size
+                self.frames += 1
+                if self.rng.random() < 1 / 30:
+                    mask = self.rng.choice((0, 0, 1 << self.rng.randrange(16)))
+                    self.writer.write(b"K" + keys_message.pack(mask))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+    async def request_stats(self):
+        self.stats = asyncio.get_running_loop().create_future()
+        self.writer.write(b"S")
+        return await self.stats
+
+    def close(self):
+        self.writer.close()
+
+
+async def measure(count, address, port, unix, seconds, warmup=1.0):
+    clients = [await Client.connect(address, port, unix, seed) for seed in range(count)]
+    tasks = [asyncio.ensure_future(client.run()) for client in clients]
+    try:
+        await asyncio.sleep(warmup)
+        control = clients[0]
+        before = await control.request_stats()
+        frames = [client.frames for client in clients]
+        started = time.monotonic()
+        await asyncio.sleep(seconds)
+        after = await control.request_stats()
+        elapsed = time.monotonic() - started
+    finally:
+        for client in clients:
+            client.close()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    rates = [(client.frames - start) / elapsed for client, start in zip(clients, frames)]
+    core = (after["cpu"] - before["cpu"]) / (after["uptime"] - before["uptime"])
+    fps = sum(rates) / len(rates)
+    return {
+        "sessions": count,
+        "fps": fps,
+        "min_fps": min(rates),
+        "server_core": core,
+        "late_ticks": after["late_ticks"] - before["late_ticks"],
+        "dropped": after["dropped"] - before["dropped"],
+        "sustained": fps >= SUSTAINED * TIMER_HZ,
+    }
+
+
+async def load_test(counts, address, port, unix, seconds):
+    results = []
+    for count in counts:
+        result = await measure(count, address, port, unix, seconds)
+        results.append(result)
+        print(
+            "%5d sessions  %5.1f fps (min %5.1f)  server %5.1f%% of a core  %s"
+            % (
+                count,
+                result["fps"],
+                result["min_fps"],
+                100 * result["server_core"],
+                "ok" if result["sustained"] else "NOT SUSTAINED",
+            )
+        )
+        if not result["sustained"]:
+            break
+    return results
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find how many sessions per core pychip8.server sustains.")
+    parser.add_argument("--rom", help="start a server for this ROM in a child process")
+    parser.add_argument("--address", default="127.0.0.1")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--unix", help="connect to this Unix socket instead of TCP")
+    parser.add_argument("--sessions", default="1,10,50,100,200,400,800", help="comma-separated session counts")
+    parser.add_argument("--seconds", type=float, default=3.0, help="measuring time per step")
+    parser.add_argument("--jit", action="store_true", help="start the server with the block cache engine")
+    parser.add_argument("--quirks", choices=sorted(PROFILES), help="start the server with this quirk profile")
+    args = parser.parse_args(argv)
+    counts = [int(count) for count in args.sessions.split(",")]
+    server = None
+    port = args.port
+    if args.rom:
+        command = [sys.executable, "-m", "pychip8.server", args.rom, "--max-sessions", str(max(counts))]
+        if args.unix:
+            command += ["--unix", args.unix]
+        else:
+            port = port or _free_port()
+            command += ["--address", args.address, "--port", str(port)]
+        if args.jit:
+            command.append("--jit")
+        if args.quirks:
+            command += ["--quirks", args.quirks]
+        package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [package_root, os.environ.get("PYTHONPATH")])))
+        server = subprocess.Popen(command, env=env)
+        # Wait for it to start listening.
+        for _ in range(100):
+            try:
+                if args.unix:
+                    with socket.socket(socket.AF_UNIX) as probe:
+                        probe.connect(args.unix)
+                else:
+                    socket.create_connection((args.address, port)).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+    elif port is None and not args.unix:
+        parser.error("give --rom to start a server, or --port/--unix to use a running one")
+    try:
+        results = asyncio.run(load_test(counts, args.address, port, args.unix, args.seconds))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    sustained = [result for result in results if result["sustained"]]
+    if not sustained:
+        print("no step was sustained")
+        return 1
+    best = sustained[-1]
+    print("sessions per core: %.0f" % (best["sessions"] / max(best["server_core"], 1e-9)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,379 @@
+import mmap
+import os
+import random
+import struct
+import sys
+from array import array
+
+from .decode import (
+    BIG_FONT_START,
+    FONT_START,
+    HIRES_HEIGHT,
+    HIRES_WIDTH,
+    SCREEN_HEIGHT,
+    SCREEN_WIDTH,
+    DecodeTable,
+)
+from .framebuffer import Framebuffer
+from .idle import Idle
+from .quirks import DEFAULT_PROFILE, PROFILES
+
+MEMORY_SIZE = 4096
+XO_MEMORY_SIZE = 0x10000
+PROGRAM_START = 0x200
+PITCH = 64  # XO-CHIP's initial pitch: the pattern plays at 4000 bits a second.
+
+STATE_MAGIC = b"C8ST"
+STATE_VERSION = 2
+# magic, version, memory size, planes, screen width, screen height, pc, I,
+# sp, delay timer, sound timer, keys, vblank, instructions run in the
+# frame, key_wait, key_wait_index, selected planes, pitch; then memory,
+# V0-VF, the stack (16 little-endian words), the RPL flags, the audio
+# pattern and the packed screen.
+_state_header = struct.Struct("<4sBIBBBHIBBBH?I?BBB")
+
+
+def memory_size(platform):
+    return XO_MEMORY_SIZE if platform == "xochip" else MEMORY_SIZE
+
+
+fontset = bytes(
+    [
+        0xF0, 0x90, 0x90, 0x90, 0xF0,  # 0
+        0x20, 0x60, 0x20, 0x20, 0x70,  # 1
+        0xF0, 0x10, 0xF0, 0x80, 0xF0,  # 2
+        0xF0, 0x10, 0xF0, 0x10, 0xF0,  # 3
+        0x90, 0x90, 0xF0, 0x10, 0x10,  # 4
+        0xF0, 0x80, 0xF0, 0x10, 0xF0,  # 5
+        0xF0, 0x80, 0xF0, 0x90, 0xF0,  # 6
+        0xF0, 0x10, 0x20, 0x40, 0x40,  # 7
+        0xF0, 0x90, 0xF0, 0x90, 0xF0,  # 8
+        0xF0, 0x90, 0xF0, 0x10, 0xF0,  # 9
+        0xF0, 0x90, 0xF0, 0x90, 0x90,  # A
+        0xE0, 0x90, 0xE0, 0x90, 0xE0,  # B
+        0xF0, 0x80, 0x80, 0x80, 0xF0,  # C
+        0xE0, 0x90, 0x90, 0x90, 0xE0,  # D
+        0xF0, 0x80, 0xF0, 0x80, 0xF0,  # E
+        0xF0, 0x80, 0xF0, 0x80, 0x80,  # F
+    ]
+)
+big_fontset = bytes(
+    [
+        0xFF, 0xFF, 0xC3, 0xC3, 0xC3, 0xC3, 0xC3, 0xC3, 0xFF, 0xFF,  # 0
+        0x18, 0x78, 0x78, 0x18, 0x18, 0x18, 0x18, 0x18, 0xFF, 0xFF,  # 1
+        0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF,  # 2
+        0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF,  # 3
+        0xC3, 0xC3, 0xC3, 0xC3, 0xFF, 0xFF, 0x03, 0x03, 0x03, 0x03,  # 4
+        0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF,  # 5
+        0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, 0xC3, 0xC3, 0xFF, 0xFF,  # 6
+        0xFF, 0xFF, 0x03, 0x03, 0x06, 0x0C, 0x18, 0x18, 0x18, 0x18,  # 7
+        0xFF, 0xFF, 0xC3, 0xC3, 0xFF, 0xFF, 0xC3, 0xC3, 0xFF, 0xFF,  # 8
+        0xFF, 0xFF, 0xC3, 0xC3, 0xFF, 0xFF, 0x03, 0x03, 0xFF, 0xFF,  # 9
+        0x7E, 0xFF, 0xC3, 0xC3, 0xC3, 0xFF, 0xFF, 0xC3, 0xC3, 0xC3,  # A
+        0xFC, 0xFC, 0xC3, 0xC3, 0xFC, 0xFC, 0xC3, 0xC3, 0xFC, 0xFC,  # B
+        0x3C, 0xFF, 0xC3, 0xC0, 0xC0, 0xC0, 0xC0, 0xC3, 0xFF, 0x3C,  # C
+        0xFC, 0xFE, 0xC3, 0xC3, 0xC3, 0xC3, 0xC3, 0xC3, 0xFE, 0xFC,  # D
+        0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF,  # E
+        0xFF, 0xFF, 0xC0, 0xC0, 0xFF, 0xFF, 0xC0, 0xC0, 0xC0, 0xC0,  # F
+    ]
+)
+
+
+class Chip8:
+    """
+    A headless Chip8 machine.
+
+    All of the state lives on the instance, so several machines can run side
+    by side in one process. Nothing here touches pygame; a frontend feeds
+    `keys` (a 16-bit mask, bit n set while key n is held) and reads `screen`.
+
+    The quirks profile's platform fixes the memory size and the number of
+    screen planes; SCHIP and XO-CHIP programs change the resolution as
+    they run.
+    """
+
+    __slots__ = (
+        "memory",
+        "v",
+        "stack",
+        "sp",
+        "pc",
+        "index",
+        "delay_timer",
+        "sound_timer",
+        "sound_ticks",
+        "screen",
+        "keys",
+        "ipf",
+        "vblank",
+        "frame_cycle",
+        "key_wait",
+        "key_wait_index",
+        "table",
+        "seed",
+        "rng",
+        "quirks",
+        "flags",
+        "pattern",
+        "pitch",
+    )
+
+    def __init__(self, rom=None, ipf=8, seed=None, quirks=DEFAULT_PROFILE):
+        self.ipf = ipf  # Instructions per 60 Hz frame.
+        self.quirks = PROFILES[quirks] if isinstance(quirks, str) else quirks
+        # Cxnn draws from a per-machine RNG; keep the seed so runs can be replayed.
+        self.seed = random.getrandbits(64) if seed is None else seed
+        self.rng = random.Random()
+        self.reset()
+        if rom is not None:
+            self.load_rom(rom)
+
+    def reset(self):
+        """Power-cycle the machine. Decoded handlers are bound to the new state."""
+        self.rng.seed(self.seed)
+        platform = self.quirks.platform
+        self.memory = bytearray(memory_size(platform))
+        self.memory[FONT_START : FONT_START + len(fontset)] = fontset
+        if platform != "chip8":
+            self.memory[BIG_FONT_START : BIG_FONT_START + len(big_fontset)] = big_fontset
+        self.v = bytearray(16)
+        self.stack = array("H", bytes(32))
+        self.sp = 0
+        self.pc = PROGRAM_START
+        self.index = 0
+        self.delay_timer = 0
+        self.sound_timer = 0
+        # Timer ticks with the sound on, so a beep set and over within one
+        # frame is still visible to whoever plays the sound.
+        self.sound_ticks = 0
+        self.screen = Framebuffer(SCREEN_WIDTH, SCREEN_HEIGHT, 2 if platform == "xochip" else 1)
+        self.flags = bytearray(16)  # SCHIP's RPL user flags.
+        self.pattern = bytearray(16)  # XO-CHIP's 128-bit audio pattern.
+        self.pitch = PITCH
+        self.keys = 0
+        self.vblank = False
+        self.frame_cycle = 0  # Instructions already run in the current frame.
+        self.key_wait = False
+        self.key_wait_index = 0
+        self.table = DecodeTable(self)
+
+    def set_quirks(self, quirks):
+        """
+        Switch to a Quirks profile (or its name) and drop the handlers built
+        for the old one. A BlockCache running the machine must be cleared too.
+        The platform can not change, since it sizes memory and the screen.
+        """
+        quirks = PROFILES[quirks] if isinstance(quirks, str) else quirks
+        if quirks.platform != self.quirks.platform:
+            raise ValueError("a %s machine can not switch to %s" % (self.quirks.platform, quirks.platform))
+        self.quirks = quirks
+        self.table.clear()
+
+    def load_rom(self, rom):
+        """Copy a ROM (a path or a bytes-like object) into memory at 0x200."""
+        if isinstance(rom, (str, os.PathLike)):
+            with open(rom, mode="rb") as f:
+                rom = f.read()
+        if len(rom) > len(self.memory) - PROGRAM_START:
+            raise ValueError(
+                "ROM is %d bytes, at most %d fit in memory"
+                % (len(rom), len(self.memory) - PROGRAM_START)
+            )
+        self.memory[PROGRAM_START : PROGRAM_START + len(rom)] = rom
+
+    def save_state(self):
+        """Snapshot the machine as bytes in the versioned state layout."""
+        screen = self.screen
+        stack = self.stack
+        if sys.byteorder == "big":
+            stack = array("H", stack)
+            stack.byteswap()
+        return b"".join(
+            (
+                _state_header.pack(
+                    STATE_MAGIC,
+                    STATE_VERSION,
+                    len(self.memory),
+                    len(screen.planes),
+                    screen.width,
+                    screen.height,
+                    self.pc,
+                    self.index,
+                    self.sp,
+                    self.delay_timer,
+                    self.sound_timer,
+                    self.keys,
+                    self.vblank,
+                    self.frame_cycle,
+                    self.key_wait,
+                    self.key_wait_index,
+                    screen.mask,
+                    self.pitch,
+                ),
+                self.memory,
+                self.v,
+                stack.tobytes(),
+                self.flags,
+                self.pattern,
+                screen.tobytes(),
+            )
+        )
+
+    def load_state(self, state):
+        """
+        Restore a snapshot from `save_state`, given as a bytes-like object or
+        as a path, which is memory-mapped rather than read. Memory, registers
+        and stack are copied in place, so decoded handlers stay valid; a
+        BlockCache running this machine needs `clear()` afterwards.
+        """
+        if isinstance(state, (str, os.PathLike)):
+            with open(state, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                self.load_state(mapped)
+            return
+        view = memoryview(state)
+        try:
+            (
+                magic,
+                version,
+                memory_size,
+                planes,
+                width,
+                height,
+                pc,
+                index,
+                sp,
+                delay_timer,
+                sound_timer,
+                keys,
+                vblank,
+                frame_cycle,
+                key_wait,
+                key_wait_index,
+                mask,
+                pitch,
+            ) = _state_header.unpack_from(view)
+            if magic != STATE_MAGIC:
+                raise ValueError("not a Chip8 save state")
+            if version != STATE_VERSION:
+                raise ValueError("unsupported save state version %d" % version)
+            screen = self.screen
+            resolutions = {(screen.width, screen.height)}
+            if self.quirks.platform != "chip8":
+                resolutions = {(SCREEN_WIDTH, SCREEN_HEIGHT), (HIRES_WIDTH, HIRES_HEIGHT)}
+            if memory_size != len(self.memory) or planes != len(screen.planes) or (width, height) not in resolutions:
+                raise ValueError("save state is for a different machine configuration")
+            offset = _state_header.size
+            end = offset + memory_size + 16 + 32 + 16 + 16 + planes * (width // 8) * height
+            if len(view) < end:
+                raise ValueError("truncated save state")
+            self.memory[:] = view[offset : offset + memory_size]
+            offset += memory_size
+            self.v[:] = view[offset : offset + 16]
+            offset += 16
+            stack = memoryview(self.stack).cast("B")
+            stack[:] = view[offset : offset + 32]
+            stack.release()
+            if sys.byteorder == "big":
+                self.stack.byteswap()
+            offset += 32
+            self.flags[:] = view[offset : offset + 16]
+            offset += 16
+            self.pattern[:] = view[offset : offset + 16]
+            offset += 16
+            if (width, height) != (screen.width, screen.height):
+                screen.resize(width, height)
+            screen.select(mask)
+            screen.frombytes(view[offset:end])
+        finally:
+            view.release()
+        self.pc = pc
+        self.index = index
+        self.sp = sp
+        self.delay_timer = delay_timer
+        self.sound_timer = sound_timer
+        self.keys = keys
+        self.vblank = vblank
+        self.frame_cycle = frame_cycle
+        self.key_wait = key_wait
+        self.key_wait_index = key_wait_index
+        self.pitch = pitch
+
+    def tick_timers(self):
+        if self.delay_timer > 0:
+            self.delay_timer -= 1
+        if self.sound_timer > 0:
+            self.sound_timer -= 1
+            self.sound_ticks += 1
+
+    def frame(self):
+        """
+        Run the rest of the 60 Hz frame (`ipf` instructions unless some were
+        stepped), then a timer tick. Whole turns of an idle loop left in the
+        frame are skipped rather than run.
+        """
+        done = self.frame_cycle
+        self.frame_cycle = 0
+        if done < self.ipf:
+            memory = self.memory
+            table = self.table
+            left = self.ipf - done - 1
+            self.vblank = not done
+            pc = self.pc
+            self.pc = pc + 2
+            try:
+                table[(memory[pc] << 8) | memory[pc + 1]]()
+            except Idle as idle:
+                left %= idle.period
+            self.vblank = False
+            while left:
+                try:
+                    for left in range(left, 0, -1):
+                        pc = self.pc
+                        self.pc = pc + 2
+                        table[(memory[pc] << 8) | memory[pc + 1]]()
+                    break
+                except Idle as idle:
+                    left = (left - 1) % idle.period
+        self.tick_timers()
+
+    def run(self, cycles):
+        """Run `cycles` instructions, as whole frames where possible."""
+        step = self.step
+        while cycles and self.frame_cycle:
+            step()
+            cycles -= 1
+        frames, rest = divmod(cycles, self.ipf)
+        frame = self.frame
+        for _ in range(frames):
+            frame()
+        for _ in range(rest):
+            step()
+
+    def step(self):
+        """
+        Fetch and execute a single instruction as part of the current frame:
+        the first of every `ipf` steps sees the vertical blank and the last
+        ticks the timers, the same as running them in `frame()`.
+        """
+        self.vblank = not self.frame_cycle
+        self.execute()
+        self.frame_cycle += 1
+        if self.frame_cycle >= self.ipf:
+            self.frame_cycle = 0
+            self.tick_timers()
+
+    def execute(self):
+        """Fetch and execute a single instruction, leaving the frame and the timers alone."""
+        memory = self.memory
+        pc = self.pc
+        self.pc = pc + 2
+        try:
+            self.table[(memory[pc] << 8) | memory[pc + 1]]()
+        except Idle:
+            pass
+        self.vblank = False
+
+    @property
+    def opcode(self):
+        """The opcode at pc, i.e. the next one to run."""
+        return (self.memory[self.pc] << 8) | self.memory[self.pc + 1]
@@ -0,0 +1,152 @@
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from .decode import DecodeTable, opcode_pattern
+
+
+class Profiler:
+    """
+    Counts what a machine executes by swapping in an instrumented decode
+    table while attached. Detached, the machine runs its normal table and
+    pays nothing.
+
+    Collected per instruction: the opcode class, the address, and the
+    shadow call stack (for folded-stack output); per 2nnn/00EE, the call or
+    return edge. Only instructions going through the table are seen, so
+    profile on the interpreter rather than a BlockCache.
+
+    Frontends can also time whole phases with `section(name)`.
+    """
+
+    def __init__(self, machine):
+        self.machine = machine
+        self.opcodes = Counter()
+        self.addresses = Counter()
+        self.calls = Counter()
+        self.returns = Counter()
+        self.stacks = Counter()
+        self.times = Counter()
+        self.stack = ()
+        self.previous = None
+
+    def attach(self):
+        self.previous = self.machine.table
+        self.machine.table = DecodeTable(self.machine, self._decode)
+
+    def detach(self):
+        self.machine.table = self.previous
+        self.previous = None
+
+    @contextmanager
+    def section(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] += time.perf_counter() - started
+
+    def _decode(self, m, opcode):
+        handler = self.previous.factory(m, opcode)
+        pattern = opcode_pattern(opcode, m.quirks.platform)
+        opcodes = self.opcodes
+        addresses = self.addresses
+        stacks = self.stacks
+        profiler = self
+
+        if pattern == "2nnn":
+            target = opcode & 0x0FFF
+            calls = self.calls
+
+            def profiled():
+                address = m.pc - 2
+                opcodes[pattern] += 1
+                addresses[address] += 1
+                stacks[profiler.stack] += 1
+                calls[address, target] += 1
+                handler()
+                # The machine's stack holds 16 entries; so does the shadow one.
+                profiler.stack = (profiler.stack + (target,))[-16:]
+
+        elif pattern == "00EE":
+            returns = self.returns
+
+            def profiled():
+                address = m.pc - 2
+                opcodes[pattern] += 1
+                addresses[address] += 1
+                stacks[profiler.stack] += 1
+                handler()
+                returns[address, m.pc] += 1
+                profiler.stack = profiler.stack[:-1]
+
+        else:
+
+            def profiled():
+                opcodes[pattern] += 1
+                addresses[m.pc - 2] += 1
+                stacks[profiler.stack] += 1
+                handler()
+
+        return profiled
+
+    def report(self, top=20):
+        total = sum(self.opcodes.values())
+        return {
+            "instructions": total,
+            "opcodes": dict(self.opcodes.most_common()),
+            "hot_addresses": [
+                {"address": "%03x" % address, "count": count}
+                for address, count in self.addresses.most_common(top)
+            ],
+            "calls": [
+                {"from": "%03x" % source, "to": "%03x" % target, "count": count}
+                for (source, target), count in self.calls.most_common()
+            ],
+            "returns": [
+                {"from": "%03x" % source, "to": "%03x" % target, "count": count}
+                for (source, target), count in self.returns.most_common()
+            ],
+            "times": dict(self.times),
+        }
+
+    def text(self, top=20):
+        report = self.report(top)
+        total = report["instructions"] or 1
+        lines = ["%d instructions" % report["instructions"], "", "opcode   count      share"]
+        for pattern, count in report["opcodes"].items():
+            lines.append("%-8s %-10d %5.1f%%" % (pattern, count, 100.0 * count / total))
+        lines += ["", "address  count      share"]
+        for entry in report["hot_addresses"]:
+            lines.append(
+                "%-8s %-10d %5.1f%%" % (entry["address"], entry["count"], 100.0 * entry["count"] / total)
+            )
+        if report["calls"]:
+            lines += ["", "calls"]
+            for entry in report["calls"][:top]:
+                lines.append("%s -> %s  %d" % (entry["from"], entry["to"], entry["count"]))
+        if report["times"]:
+            lines += ["", "time"]
+            for name, seconds in sorted(report["times"].items()):
+                lines.append("%-12s %.3fs" % (name, seconds))
+        return "\n".join(lines) + "\n"
+
+    def folded(self):
+        """Instruction counts per call stack, in the folded format flamegraph tools read."""
+        lines = []
+        for stack, count in sorted(self.stacks.items()):
+            frames = ["main"] + ["sub_%03x" % address for address in stack]
+            lines.append("%s %d" % (";".join(frames), count))
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Save a report, as JSON for .json, folded stacks for .folded, else text."""
+        if path.endswith(".json"):
+            data = json.dumps(self.report(), indent=2) + "\n"
+        elif path.endswith(".folded"):
+            data = self.folded()
+        else:
+            data = self.text()
+        with open(path, "w") as f:
+            f.write(data)
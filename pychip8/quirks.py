@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+
+PLATFORMS = ("chip8", "schip", "xochip")
+PROFILE_DB = os.path.join(
+    os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config"),
+    "pychip8",
+    "profiles.json",
+)
+
+
+class Quirks:
+    """
+    The behaviours CHIP-8 interpreters disagree on. Handlers read these once,
+    when an opcode is decoded, so a profile costs nothing per instruction;
+    a machine's table has to be rebuilt (`Chip8.set_quirks`) to change them.
+
+    vf_reset        8xy1/8xy2/8xy3 clear VF
+    index_increment what Fx55/Fx65 add to I: "x+1", "x", "1" or "0"
+    shift_vy        8xy6/8xyE shift Vy into Vx rather than Vx in place
+    jump_vx         Bnnn jumps to nnn + Vx rather than nnn + V0
+    display_wait    Dxyn waits for the start of a frame before drawing
+    platform        the instruction set: "chip8", "schip" (128x64 hi-res,
+                    scrolling, 16x16 sprites, RPL flags) or "xochip" (schip
+                    plus 64 KB of memory, two bit-planes and sample audio)
+    """
+
+    __slots__ = ("name", "vf_reset", "index_increment", "shift_vy", "jump_vx", "display_wait", "platform")
+
+    def __init__(self, name, vf_reset, index_increment, shift_vy, jump_vx, display_wait, platform="chip8"):
+        if index_increment not in ("x+1", "x", "1", "0"):
+            raise ValueError("unknown index increment %r" % index_increment)
+        if platform not in PLATFORMS:
+            raise ValueError("unknown platform %r" % platform)
+        self.name = name
+        self.vf_reset = vf_reset
+        self.index_increment = index_increment
+        self.shift_vy = shift_vy
+        self.jump_vx = jump_vx
+        self.display_wait = display_wait
+        self.platform = platform
+
+    def __repr__(self):
+        return "Quirks(%s)" % ", ".join("%s=%r" % (name, getattr(self, name)) for name in self.__slots__)
+
+    def step(self, x):
+        """What Fx55/Fx65 with this x add to I."""
+        return {"x+1": x + 1, "x": x, "1": 1, "0": 0}[self.index_increment]
+
+
+PROFILES = {
+    # What this interpreter has always done.
+    "legacy": Quirks("legacy", True, "1", False, True, True),
+    "vip": Quirks("vip", True, "x+1", True, False, True),
+    "chip48": Quirks("chip48", False, "x", False, True, False),
+    "schip": Quirks("schip", False, "0", False, True, False, "schip"),
+    "xochip": Quirks("xochip", False, "x+1", True, False, False, "xochip"),
+    "modern": Quirks("modern", False, "0", False, False, False),
+}
+DEFAULT_PROFILE = "legacy"
+
+
+def rom_profile(rom, path=PROFILE_DB):
+    """The profile name remembered for `rom` (bytes), or None."""
+    try:
+        with open(path) as f:
+            profiles = json.load(f)
+    except (OSError, ValueError):
+        return None
+    name = profiles.get(hashlib.sha1(rom).hexdigest())
+    return name if name in PROFILES else None
+
+
+def remember_profile(rom, name, path=PROFILE_DB):
+    """Record `name` as the profile for `rom` (bytes)."""
+    if name not in PROFILES:
+        raise ValueError("unknown quirk profile %r" % name)
+    try:
+        with open(path) as f:
+            profiles = json.load(f)
+    except (OSError, ValueError):
+        profiles = {}
+    profiles[hashlib.sha1(rom).hexdigest()] = name
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(profiles, f, indent=2, sort_keys=True)
+        f.write("\n")
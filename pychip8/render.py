@@ -0,0 +1,103 @@
+import pygame
+
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+GREY = (170, 170, 170)
+DARK_GREY = (85, 85, 85)
+
+
+class _PlaneColours(dict):
+    """
+    The RGB bytes of 8 pixels of a two-plane display, keyed by the byte of
+    plane 0 OR'd with the byte of plane 1 shifted up 8; built as pairs of
+    bytes turn up rather than all 65536 up front.
+    """
+
+    __slots__ = ("colours",)
+
+    def __init__(self, colours):
+        dict.__init__(self)
+        self.colours = colours
+
+    def __missing__(self, key):
+        colours = self.colours
+        value = self[key] = b"".join(
+            colours[((key >> (7 - bit)) & 1) | ((key >> (14 - bit)) & 2)] for bit in range(8)
+        )
+        return value
+
+
+class Renderer:
+    """
+    Draws a Framebuffer into a pygame window.
+
+    Changed rows are expanded into an RGB buffer that backs a width x height
+    surface, which is scaled and blitted onto the window once. Frames where
+    nothing was drawn are skipped entirely. The window keeps the size of
+    the framebuffer it started with; a framebuffer that changes resolution
+    is scaled to fit it.
+
+    `palette` gives the colour of each pixel value: off and on for one
+    plane, then plane 2 only and both planes lit for two.
+    """
+
+    def __init__(self, framebuffer, scale=10, palette=(BLACK, WHITE, DARK_GREY, GREY)):
+        self.framebuffer = framebuffer
+        self.scale = scale
+        self.palette = palette
+        self.window = pygame.display.set_mode((framebuffer.width * scale, framebuffer.height * scale))
+        colours = [bytes(colour) for colour in palette]
+        # Every byte of a packed row maps to the 24 RGB bytes of its 8 pixels.
+        self.expand = [
+            b"".join(colours[1] if byte & (0x80 >> bit) else colours[0] for bit in range(8))
+            for byte in range(256)
+        ]
+        self.expand_planes = _PlaneColours(colours) if len(framebuffer.planes) > 1 else None
+        self.size = None
+
+    def _allocate(self):
+        """(Re)build the buffer and surfaces for the framebuffer's resolution."""
+        framebuffer = self.framebuffer
+        width = framebuffer.width
+        height = framebuffer.height
+        self.size = (width, height)
+        self.pixels = bytearray(width * height * 3)
+        self.surface = pygame.image.frombuffer(self.pixels, self.size, "RGB")
+        self.scaled = pygame.Surface(self.window.get_size(), 0, self.surface)
+        framebuffer.dirty = framebuffer.all_rows
+
+    def draw(self):
+        """Refresh the window if the framebuffer changed. Returns True if it did."""
+        framebuffer = self.framebuffer
+        if self.size != (framebuffer.width, framebuffer.height):
+            self._allocate()
+        dirty = framebuffer.dirty
+        if not dirty:
+            return False
+        framebuffer.dirty = 0
+        pixels = self.pixels
+        size = framebuffer.width // 8
+        pitch = framebuffer.width * 3
+        if self.expand_planes is None:
+            rows = framebuffer.rows
+            expand = self.expand
+            while dirty:
+                y = (dirty & -dirty).bit_length() - 1
+                dirty &= dirty - 1
+                pixels[y * pitch : (y + 1) * pitch] = b"".join(
+                    map(expand.__getitem__, rows[y].to_bytes(size, "big"))
+                )
+        else:
+            low, high = framebuffer.planes
+            expand = self.expand_planes
+            while dirty:
+                y = (dirty & -dirty).bit_length() - 1
+                dirty &= dirty - 1
+                pixels[y * pitch : (y + 1) * pitch] = b"".join(
+                    expand[first | (second << 8)]
+                    for first, second in zip(low[y].to_bytes(size, "big"), high[y].to_bytes(size, "big"))
+                )
+        pygame.transform.scale(self.surface, self.scaled.get_size(), self.scaled)
+        self.window.blit(self.scaled, (0, 0))
+        pygame.display.flip()
+        return True
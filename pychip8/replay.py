@@ -0,0 +1,165 @@
+import argparse
+import hashlib
+import struct
+import sys
+
+from .input import InputSource, ScriptedInput, read_key_log, write_key_log
+from .jit import BlockCache
+from .machine import Chip8
+from .quirks import DEFAULT_PROFILE, PROFILES
+from .scheduler import Scheduler
+
+SESSION_MAGIC = b"C8REC"
+SESSION_VERSION = 2
+# magic, version, seed, cpu_hz, frames, ROM SHA-1, screen and register
+# hashes, quirk profile name; version 1 had no profile and ran the default.
+_header = struct.Struct("<5sBQdI20s20s20s16s")
+_header_v1 = struct.Struct("<5sBQdI20s20s20s")
+
+
+def state_hashes(machine):
+    """SHA-1 hex digests of the framebuffer and of the CPU registers."""
+    screen = hashlib.sha1(machine.screen.tobytes()).hexdigest()
+    registers = hashlib.sha1(
+        bytes(machine.v)
+        + machine.stack.tobytes()
+        + struct.pack(
+            "<HHHBB",
+            machine.pc,
+            machine.index & 0xFFFF,
+            machine.sp,
+            machine.delay_timer,
+            machine.sound_timer,
+        )
+    ).hexdigest()
+    return screen, registers
+
+
+class Recorder(InputSource):
+    """
+    Wraps another input source and logs every change of the key mask by
+    frame. Only whole frames are reproducible: instructions run by
+    single-stepping while paused are not part of the log.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.changes = []
+        self.mask = 0
+
+    @property
+    def quit(self):
+        return self.source.quit
+
+    def __getattr__(self, name):
+        return getattr(self.source, name)
+
+    def poll(self, frame):
+        mask = self.source.poll(frame)
+        if mask != self.mask:
+            self.mask = mask
+            if self.changes and self.changes[-1][0] == frame:
+                self.changes[-1] = (frame, mask)
+            else:
+                self.changes.append((frame, mask))
+        return mask
+
+    def save(self, path, machine, rom, cpu_hz, frames):
+        """Write the session with the machine's current hashes as the expected result."""
+        screen, registers = state_hashes(machine)
+        with open(path, "wb") as f:
+            f.write(
+                _header.pack(
+                    SESSION_MAGIC,
+                    SESSION_VERSION,
+                    machine.seed,
+                    cpu_hz,
+                    frames,
+                    hashlib.sha1(rom).digest(),
+                    bytes.fromhex(screen),
+                    bytes.fromhex(registers),
+                    machine.quirks.name.encode("ascii"),
+                )
+            )
+            write_key_log(f, self.changes)
+
+
+class Session:
+    __slots__ = ("seed", "cpu_hz", "frames", "rom_sha1", "screen", "registers", "changes", "quirks")
+
+    def __init__(self, seed, cpu_hz, frames, rom_sha1, screen, registers, changes, quirks=DEFAULT_PROFILE):
+        self.seed = seed
+        self.cpu_hz = cpu_hz
+        self.frames = frames
+        self.rom_sha1 = rom_sha1
+        self.screen = screen
+        self.registers = registers
+        self.changes = changes
+        self.quirks = quirks  # Name of the quirk profile recorded with.
+
+
+def load_session(path):
+    with open(path, "rb") as f:
+        start = f.read(_header_v1.size)
+        magic, version, seed, cpu_hz, frames, rom_sha1, screen, registers = _header_v1.unpack(start)
+        if magic != SESSION_MAGIC:
+            raise ValueError("not a Chip8 session recording")
+        if version == 1:
+            quirks = DEFAULT_PROFILE
+        elif version == SESSION_VERSION:
+            quirks = _header.unpack(start + f.read(_header.size - _header_v1.size))[-1]
+            quirks = quirks.rstrip(b"\0").decode("ascii")
+        else:
+            raise ValueError("unsupported session version %d" % version)
+        changes = read_key_log(f)
+    return Session(seed, cpu_hz, frames, rom_sha1.hex(), screen.hex(), registers.hex(), changes, quirks)
+
+
+def replay(session, rom, jit=False, quirks=None):
+    """
+    Re-run a recorded session headless and unthrottled, with the quirk
+    profile it was recorded with unless `quirks` overrides it. Returns the
+    final (screen, registers) hashes.
+    """
+    if hashlib.sha1(rom).hexdigest() != session.rom_sha1:
+        raise ValueError("ROM does not match the one the session was recorded with")
+    if quirks is None:
+        quirks = session.quirks
+        if quirks not in PROFILES:
+            raise ValueError("session was recorded with an unknown quirk profile %r" % quirks)
+    machine = Chip8(rom, seed=session.seed, quirks=quirks)
+    scheduler = Scheduler(BlockCache(machine) if jit else machine, cpu_hz=session.cpu_hz, throttle=False)
+    source = ScriptedInput(session.changes)
+    for frame in range(session.frames):
+        machine.keys = source.poll(frame)
+        scheduler.frame()
+    return state_hashes(machine)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded Chip8 session headless.")
+    parser.add_argument("session", help="session file written while recording")
+    parser.add_argument("rom", help="the ROM the session was recorded with")
+    parser.add_argument("--jit", action="store_true", help="use the block cache engine")
+    parser.add_argument("--quirks", choices=sorted(PROFILES), help="quirk profile (default: the one recorded with)")
+    args = parser.parse_args(argv)
+    session = load_session(args.session)
+    with open(args.rom, "rb") as f:
+        rom = f.read()
+    try:
+        screen, registers = replay(session, rom, jit=args.jit, quirks=args.quirks)
+    except ValueError as e:
+        parser.error(str(e))
+    print("frames:    %d" % session.frames)
+    print("quirks:    %s" % (args.quirks or session.quirks))
+    print("screen:    %s" % screen)
+    print("registers: %s" % registers)
+    if (screen, registers) != (session.screen, session.registers):
+        print("MISMATCH: recorded screen %s registers %s" % (session.screen, session.registers))
+        return 1
+    print("match")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+import zlib
+from collections import deque
+
+
+def _xor(a, b):
+    return (int.from_bytes(a, "little") ^ int.from_bytes(b, "little")).to_bytes(len(a), "little")
+
+
+class Rewind:
+    """
+    A bounded history of per-frame save states for stepping backwards.
+
+    Every `keyframe_interval` frames a full state is kept; the frames in
+    between are stored as the zlib-compressed XOR of their state against
+    that keyframe, which is almost all zero bytes and compresses to a few
+    dozen bytes. A keyframe and its deltas form a group, and whole groups
+    are evicted oldest-first once `limit` bytes are in use.
+    """
+
+    def __init__(self, machine, limit=8 << 20, keyframe_interval=60):
+        self.machine = machine
+        self.limit = limit
+        self.keyframe_interval = keyframe_interval
+        self.groups = deque()  # [keyframe, deltas, size]
+        self.size = 0
+
+    def __len__(self):
+        return sum(1 + len(group[1]) for group in self.groups)
+
+    def record(self):
+        """Push the machine's current state; call once per frame."""
+        state = self.machine.save_state()
+        groups = self.groups
+        # A change of resolution changes the state's length, so it starts a group.
+        if groups and len(groups[-1][1]) + 1 < self.keyframe_interval and len(groups[-1][0]) == len(state):
+            group = groups[-1]
+            delta = zlib.compress(_xor(state, group[0]), 1)
+            group[1].append(delta)
+            group[2] += len(delta)
+            self.size += len(delta)
+        else:
+            groups.append([state, [], len(state)])
+            self.size += len(state)
+        while self.size > self.limit and len(groups) > 1:
+            self.size -= groups.popleft()[2]
+
+    def back(self):
+        """
+        Drop the newest state and restore the machine to the one before it.
+        Returns False, leaving the machine alone, when there is nothing older.
+        """
+        groups = self.groups
+        if not groups or (len(groups) == 1 and not groups[0][1]):
+            return False
+        group = groups[-1]
+        if group[1]:
+            delta = group[1].pop()
+            group[2] -= len(delta)
+            self.size -= len(delta)
+        else:
+            groups.pop()
+            self.size -= group[2]
+            group = groups[-1]
+        if group[1]:
+            self.machine.load_state(_xor(zlib.decompress(group[1][-1]), group[0]))
+        else:
+            self.machine.load_state(group[0])
+        return True
+
+    def clear(self):
+        self.groups.clear()
+        self.size = 0
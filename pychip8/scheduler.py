@@ -0,0 +1,91 @@
+import time
+from collections import deque
+
+TIMER_HZ = 60
+DEFAULT_CPU_HZ = 500
+
+
+class Scheduler:
+    """
+    Paces an engine (a Chip8 or a BlockCache) against the wall clock.
+
+    Each call to `frame()` runs one 60 Hz frame: cpu_hz / 60 instructions,
+    carrying the fractional part over to later frames, then one timer tick.
+    `wait()` sleeps until the next frame is due. With `throttle` off frames
+    run back to back, which is what batch and test runs want.
+
+    A host that falls more than `max_lag` frames behind is resynced rather
+    than made to catch up in a burst; those frames are counted as late.
+    """
+
+    def __init__(self, engine, cpu_hz=DEFAULT_CPU_HZ, throttle=True, max_lag=5, window=600):
+        self.engine = engine
+        self.machine = getattr(engine, "machine", engine)
+        self.cpu_hz = cpu_hz
+        self.throttle = throttle
+        self.max_lag = max_lag
+        self.period = 1.0 / TIMER_HZ
+        self.carry = 0.0
+        self.frames = 0
+        self.instructions = 0
+        self.late_frames = 0
+        self.intervals = deque(maxlen=window)
+        self.started = time.perf_counter()
+        self.deadline = self.started
+        self.last_frame = None
+
+    def frame(self):
+        """Run one frame of instructions and tick the timers."""
+        now = time.perf_counter()
+        if self.last_frame is not None:
+            self.intervals.append(now - self.last_frame)
+        self.last_frame = now
+        budget = self.cpu_hz / TIMER_HZ + self.carry
+        ipf = int(budget)
+        self.carry = budget - ipf
+        if ipf:
+            self.machine.ipf = ipf
+            self.engine.frame()
+        else:
+            self.machine.tick_timers()
+        self.frames += 1
+        self.instructions += ipf
+
+    def wait(self):
+        """Sleep until the next frame is due."""
+        if not self.throttle:
+            return
+        self.deadline += self.period
+        delay = self.deadline - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        elif -delay > self.period * self.max_lag:
+            self.late_frames += 1
+            self.deadline = time.perf_counter()
+
+    def reset_clock(self):
+        """Start pacing afresh, e.g. after the emulator was paused."""
+        self.deadline = time.perf_counter()
+        self.last_frame = None
+
+    def report(self):
+        """Achieved rates and frame-time jitter (over the last `window` frames)."""
+        elapsed = time.perf_counter() - self.started
+        intervals = self.intervals
+        report = {
+            "cpu_hz": self.cpu_hz,
+            "frames": self.frames,
+            "instructions": self.instructions,
+            "elapsed": elapsed,
+            "ips": self.instructions / elapsed if elapsed else 0.0,
+            "fps": self.frames / elapsed if elapsed else 0.0,
+            "late_frames": self.late_frames,
+            "jitter_ms": 0.0,
+            "max_jitter_ms": 0.0,
+        }
+        if intervals:
+            target = self.period if self.throttle else sum(intervals) / len(intervals)
+            deviations = [abs(interval - target) for interval in intervals]
+            report["jitter_ms"] = 1000 * sum(deviations) / len(deviations)
+            report["max_jitter_ms"] = 1000 * max(deviations)
+        return report
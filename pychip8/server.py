@@ -0,0 +1,217 @@
+"""
+Hosts many Chip8 sessions in one asyncio process.
+
+    python -m pychip8.server ROM [--port 8564 | --unix PATH]
+
+Every connection gets its own machine running the server's ROM. One task
+advances all sessions a frame at a time at 60 Hz and sends each client
+only the rows that changed. All integers are little-endian except row
+data, which is big-endian as in `Framebuffer.tobytes()`.
+
+server -> client
+    hello  b"C8SV" version:u8 width:u8 height:u8 planes:u8
+    resize b"R" width:u8 height:u8, sent before the first frame at a new
+           resolution (SCHIP and XO-CHIP programs switch as they run)
+    frame  b"F" frame:u32 rows:u64, then planes * width // 8 bytes for each
+           set bit of `rows`, lowest row first, plane after plane
+    stats  b"S" length:u32, then that many bytes of JSON
+
+client -> server
+    keys   b"K" mask:u16
+    stats  b"S"
+
+A client whose socket buffer is over `buffer_limit` bytes simply misses
+frames; the rows it missed stay marked and go out with the next frame it
+does get, so its screen still ends up right.
+"""
+import argparse
+import asyncio
+import json
+import struct
+import sys
+import time
+
+from .jit import BlockCache
+from .machine import Chip8
+from .quirks import DEFAULT_PROFILE, PROFILES
+from .scheduler import DEFAULT_CPU_HZ, TIMER_HZ, Scheduler
+
+HELLO_MAGIC = b"C8SV"
+PROTOCOL_VERSION = 2
+DEFAULT_PORT = 8564
+hello = struct.Struct("<4sBBBB")
+resize_message = struct.Struct("<cBB")
+frame_header = struct.Struct("<cIQ")
+keys_message = struct.Struct("<H")
+stats_header = struct.Struct("<cI")
+
+
+class Session:
+    __slots__ = ("machine", "scheduler", "writer", "frames", "dropped", "size")
+
+    def __init__(self, machine, scheduler, writer):
+        self.machine = machine
+        self.scheduler = scheduler
+        self.writer = writer
+        self.frames = 0
+        self.dropped = 0
+        # The resolution the client was last told about.
+        self.size = (machine.screen.width, machine.screen.height)
+
+
+class Host:
+    """
+    The sessions and the 60 Hz loop that runs them. Each session has its own
+    Scheduler, unthrottled, for the instructions-per-frame bookkeeping; the
+    pacing is done once for everybody by `run()`.
+    """
+
+    def __init__(
+        self,
+        rom,
+        cpu_hz=DEFAULT_CPU_HZ,
+        max_sessions=1024,
+        jit=False,
+        buffer_limit=64 << 10,
+        max_lag=5,
+        quirks=DEFAULT_PROFILE,
+    ):
+        self.rom = rom
+        self.quirks = quirks
+        self.cpu_hz = cpu_hz
+        self.max_sessions = max_sessions
+        self.jit = jit
+        self.buffer_limit = buffer_limit
+        self.max_lag = max_lag
+        self.sessions = []
+        self.ticks = 0
+        self.late_ticks = 0
+        self.started = time.monotonic()
+
+    def open(self, writer):
+        machine = Chip8(self.rom, quirks=self.quirks)
+        engine = BlockCache(machine) if self.jit else machine
+        session = Session(machine, Scheduler(engine, cpu_hz=self.cpu_hz, throttle=False), writer)
+        self.sessions.append(session)
+        return session
+
+    def close(self, session):
+        self.sessions.remove(session)
+
+    async def handle(self, reader, writer):
+        """Connection callback for asyncio.start_server / start_unix_server."""
+        if len(self.sessions) >= self.max_sessions:
+            writer.close()
+            return
+        session = self.open(writer)
+        screen = session.machine.screen
+        writer.write(hello.pack(HELLO_MAGIC, PROTOCOL_VERSION, screen.width, screen.height, len(screen.planes)))
+        try:
+            while True:
+                kind = await reader.readexactly(1)
+                if kind == b"K":
+                    (session.machine.keys,) = keys_message.unpack(await reader.readexactly(keys_message.size))
+                elif kind == b"S":
+                    data = json.dumps(self.stats()).encode()
+                    writer.write(stats_header.pack(b"S", len(data)) + data)
+                else:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.close(session)
+            writer.close()
+
+    def send(self, session):
+        """Send the rows changed since the client's last frame, unless it is backed up."""
+        writer = session.writer
+        if writer.transport.get_write_buffer_size() > self.buffer_limit:
+            session.dropped += 1
+            return
+        screen = session.machine.screen
+        parts = []
+        if session.size != (screen.width, screen.height):
+            session.size = (screen.width, screen.height)
+            parts.append(resize_message.pack(b"R", screen.width, screen.height))
+        dirty = screen.dirty
+        screen.dirty = 0
+        planes = screen.planes
+        size = screen.width // 8
+        parts.append(frame_header.pack(b"F", session.frames, dirty))
+        while dirty:
+            y = (dirty & -dirty).bit_length() - 1
+            dirty &= dirty - 1
+            for rows in planes:
+                parts.append(rows[y].to_bytes(size, "big"))
+        writer.write(b"".join(parts))
+
+    def tick(self):
+        """Advance every session one frame and send out the changes."""
+        for session in self.sessions:
+            session.scheduler.frame()
+            session.frames += 1
+            self.send(session)
+        self.ticks += 1
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        period = 1.0 / TIMER_HZ
+        deadline = loop.time()
+        while True:
+            self.tick()
+            deadline += period
+            delay = deadline - loop.time()
+            if delay < -period * self.max_lag:
+                self.late_ticks += 1
+                deadline = loop.time()
+                delay = 0
+            # Sleeping even when late lets the connections be served.
+            await asyncio.sleep(max(delay, 0))
+
+    def stats(self):
+        return {
+            "sessions": len(self.sessions),
+            "ticks": self.ticks,
+            "late_ticks": self.late_ticks,
+            "dropped": sum(session.dropped for session in self.sessions),
+            "uptime": time.monotonic() - self.started,
+            "cpu": time.process_time(),
+        }
+
+
+async def serve(host, address="127.0.0.1", port=DEFAULT_PORT, unix=None):
+    if unix:
+        server = await asyncio.start_unix_server(host.handle, unix)
+    else:
+        server = await asyncio.start_server(host.handle, address, port)
+    async with server:
+        await host.run()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve Chip8 sessions over TCP or a Unix socket.")
+    parser.add_argument("rom")
+    parser.add_argument("--address", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--speed", type=int, default=DEFAULT_CPU_HZ, help="instructions per second per session")
+    parser.add_argument("--max-sessions", type=int, default=1024)
+    parser.add_argument("--jit", action="store_true", help="use the block cache engine")
+    parser.add_argument("--quirks", choices=sorted(PROFILES), default=DEFAULT_PROFILE, help="quirk profile")
+    args = parser.parse_args(argv)
+    with open(args.rom, "rb") as f:
+        rom = f.read()
+    try:
+        Chip8(rom, quirks=args.quirks)
+    except ValueError as e:
+        parser.error(str(e))
+    host = Host(rom, cpu_hz=args.speed, max_sessions=args.max_sessions, jit=args.jit, quirks=args.quirks)
+    try:
+        asyncio.run(serve(host, args.address, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+import random
+
+import pytest
+
+
+@pytest.fixture
+def random_rom():
+    """Makes ROMs of random bytes: random_rom(seed, size=256)."""
+
+    def make(seed, size=256):
+        rng = random.Random(seed)
+        return bytes(rng.getrandbits(8) for _ in range(size))
+
+    return make
+
+
+@pytest.fixture
+def outcome():
+    """
+    outcome(advance, state, frames) calls `advance` up to `frames` times and
+    returns `state()` after each, ending with the exception type if one was
+    raised, so two engines can be compared up to and including a crash.
+    """
+
+    def run(advance, state, frames):
+        states = []
+        try:
+            for _ in range(frames):
+                advance()
+                states.append(state())
+        except (IndexError, ValueError, OverflowError) as error:
+            states.append(type(error))
+        return states
+
+    return run
@@ -0,0 +1,24 @@
+from pychip8.analysis import Analysis, analyse
+
+# The jump to 0x208 is only reached by not skipping.
+SKIPPING_ROM = bytes.fromhex(
+    "3000"  # 200: skip if V0 == 00
+    "1208"  # 202: jump 208
+    "6001"  # 204: V0 = 01
+    "1206"  # 206: jump 206
+    "6102"  # 208: V1 = 02
+    "120a"  # 20a: jump 20a
+)
+
+
+def test_a_skips_fall_through_is_code():
+    analysis = Analysis.of(SKIPPING_ROM)
+    assert sorted(analysis.code) == [0x200, 0x202, 0x204, 0x206, 0x208, 0x20A]
+    assert analysis.blocks[0x202] == (0x204, [(0x208, "jump")])
+    assert 0x208 in analysis.blocks
+
+
+def test_cached_analysis_matches_a_fresh_one(tmp_path):
+    first = analyse(SKIPPING_ROM, str(tmp_path))
+    second = analyse(SKIPPING_ROM, str(tmp_path))
+    assert second.to_json() == first.to_json() == Analysis.of(SKIPPING_ROM).to_json()
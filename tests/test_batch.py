@@ -0,0 +1,113 @@
+import random
+
+import pytest
+
+from pychip8 import Chip8
+
+np = pytest.importorskip("numpy")
+
+from pychip8.batch import BatchMachine, LaneRandom  # noqa: E402
+
+# V0-V3 = random bytes, then draw V0's digit and loop.
+RANDOM_ROM = bytes.fromhex("c0ff c1ff c2ff c3ff f029 d125 1200")
+
+
+@pytest.mark.parametrize("quirks", ["legacy", "modern"])
+def test_a_lane_matches_the_interpreter(quirks, random_rom, outcome):
+    for seed in range(60):
+        rom = random_rom(seed)
+        batch = BatchMachine(rom, 1, ipf=7, seed=[seed], quirks=quirks)
+        single = Chip8(rom, ipf=7, quirks=quirks)
+        single.rng = LaneRandom(seed)
+        expected = outcome(single.frame, single.save_state, 20)
+        assert outcome(batch.frame, lambda: batch.machine(0).save_state(), 20) == expected, (quirks, seed)
+
+
+def lane_splitting_rom(seed, size=96):
+    """
+    Random V0-V3, then a loop of random skips, ALU, key, timer, draw and
+    memory instructions, so lanes keep splitting up and joining again.
+    """
+    rng = random.Random(seed)
+    rom = bytearray(bytes.fromhex("c0ff c1ff c2ff c3ff"))
+    while len(rom) < size:
+        high = rng.choice([0x3, 0x4, 0x5, 0x6, 0x7, 0x8, 0x8, 0x9, 0xA, 0xC, 0xD, 0xE, 0xF])
+        low = rng.getrandbits(8)
+        if high == 0xA:
+            low = rng.randrange(0x300, 0x1000)
+            high, low = 0xA0 | low >> 8, low & 0xFF
+        elif high == 0xE:
+            high, low = 0xE0 | rng.randrange(16), rng.choice((0x9E, 0xA1))
+        elif high == 0xF:
+            high, low = 0xF0 | rng.randrange(16), rng.choice((0x07, 0x15, 0x18, 0x1E, 0x29, 0x33, 0x55, 0x65))
+        else:
+            high = high << 4 | rng.randrange(16)
+        rom += bytes([high, low])
+    # Twice, so a skip lands on a jump too.
+    return bytes(rom) + bytes.fromhex("1208 1208")
+
+
+@pytest.mark.parametrize("quirks", ["legacy", "modern"])
+def test_lanes_that_split_up_match_the_interpreter(quirks, outcome):
+    keys = [0x0000, 0x0001, 0x0210, 0xFFFF]
+    for seed in range(30):
+        rom = lane_splitting_rom(seed)
+        batch = BatchMachine(rom, len(keys), ipf=7, seed=[seed + lane for lane in range(len(keys))], quirks=quirks)
+        batch.keys[:] = keys
+        singles = []
+        for lane, key in enumerate(keys):
+            single = Chip8(rom, ipf=7, quirks=quirks)
+            single.rng = LaneRandom(seed + lane)
+            single.keys = key
+            singles.append(single)
+
+        def frame():
+            for single in singles:
+                single.frame()
+
+        def states():
+            return [batch.machine(lane).save_state() for lane in range(len(keys))]
+
+        expected = outcome(frame, lambda: [single.save_state() for single in singles], 20)
+        assert outcome(batch.frame, states, 20) == expected, (quirks, seed)
+
+
+def test_sprites_and_bcd_wrap_like_the_interpreter():
+    rom = bytes.fromhex("60ff 61ff 62ff affe f255 affe d335 120e")
+    batch = BatchMachine(rom, 1, quirks="modern")
+    single = Chip8(rom, quirks="modern")
+    for _ in range(5):
+        batch.frame()
+        single.frame()
+    assert batch.machine(0).save_state() == single.save_state()
+
+
+def test_running_off_the_end_of_memory_raises():
+    batch = BatchMachine(bytes.fromhex("1ffe"), 2)
+    with pytest.raises(IndexError):
+        batch.run(4)
+
+
+def test_lanes_draw_independently():
+    batch = BatchMachine(RANDOM_ROM, 64, ipf=8, seed=1)
+    batch.frame()
+    assert len({bytes(registers[:4].astype(np.uint8)) for registers in batch.v.T}) == 64
+
+
+def test_a_lane_taken_out_keeps_drawing_its_numbers():
+    batch = BatchMachine(RANDOM_ROM, 4, ipf=8, seed=[10, 20, 30, 40])
+    for _ in range(5):
+        batch.frame()
+    single = batch.machine(2)
+    for _ in range(5):
+        batch.frame()
+        single.frame()
+    assert batch.machine(2).save_state() == single.save_state()
+
+
+def test_one_seed_reproduces_a_batch():
+    first = BatchMachine(RANDOM_ROM, 8, seed=5)
+    second = BatchMachine(RANDOM_ROM, 8, seed=5)
+    first.run(100)
+    second.run(100)
+    assert (first.v == second.v).all()
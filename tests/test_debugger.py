@@ -0,0 +1,67 @@
+import pytest
+
+from pychip8 import Chip8
+from pychip8.debugger import BreakpointHit, Debugger
+
+# I = 300; then forever: store V0 at I, V0 += 1 (I stays put under modern).
+STORE_LOOP = bytes.fromhex("a300 f055 7001 1202")
+
+
+def hits(machine, frames):
+    """Run `frames` frames, carrying on after every hit; returns the hits."""
+    found = []
+    for _ in range(frames):
+        try:
+            machine.frame()
+        except BreakpointHit as hit:
+            found.append(hit)
+    return found
+
+
+def test_a_watchpoint_in_a_loop_fires_every_time():
+    machine = Chip8(STORE_LOOP, ipf=9, quirks="modern")
+    debugger = Debugger(machine)
+    debugger.add_watchpoint(0x300, 0x301, "w")
+    found = hits(machine, 50)
+    # Each frame resumes on the store, then loops round to it again.
+    assert len(found) == 50
+    assert {(hit.address, hit.reason) for hit in found} == {(0x202, "write watchpoint 300-301")}
+    assert machine.memory[0x300] == 48
+
+
+def test_a_breakpoint_in_a_loop_fires_every_time():
+    machine = Chip8(STORE_LOOP, ipf=9, quirks="modern")
+    debugger = Debugger(machine)
+    debugger.add_breakpoint(0x204)
+    assert len(hits(machine, 20)) == 20
+
+
+def test_resuming_runs_the_instruction_that_hit():
+    machine = Chip8(STORE_LOOP, ipf=9, quirks="modern")
+    debugger = Debugger(machine)
+    debugger.add_breakpoint(0x202)
+    with pytest.raises(BreakpointHit):
+        machine.frame()
+    assert machine.pc == 0x202
+    machine.step()
+    assert machine.pc == 0x204
+    assert machine.memory[0x300] == 0
+    machine.step()
+    assert machine.v[0] == 1
+
+
+def test_a_read_watchpoint_ignores_writes():
+    machine = Chip8(STORE_LOOP, ipf=9, quirks="modern")
+    debugger = Debugger(machine)
+    debugger.add_watchpoint(0x300, 0x301, "r")
+    assert hits(machine, 10) == []
+
+
+def test_disarming_restores_the_machine_table():
+    machine = Chip8(STORE_LOOP, ipf=9, quirks="modern")
+    table = machine.table
+    debugger = Debugger(machine)
+    debugger.add_watchpoint(0x300, 0x301)
+    assert machine.table is not table
+    debugger.clear()
+    assert machine.table is table
@@ -0,0 +1,113 @@
+import random
+
+import pytest
+
+from pychip8 import BlockCache, Chip8
+from pychip8.quirks import PROFILES
+
+EXTENDED = {
+    "chip8": [],
+    "schip": ["00c%x", "00fb", "00fc", "00fe", "00ff", "d%x%x0", "f%x30", "f%x75", "f%x85"],
+    "xochip": [
+        "00c%x", "00d%x", "00fb", "00fc", "00fe", "00ff", "d%x%x0", "f%x30", "f%x75", "f%x85",
+        "f%x01", "f002", "f%x3a", "5%x%x2", "5%x%x3", "f000",
+    ],
+}
+
+
+def random_rom(rng, platform, size=512):
+    """
+    Random code biased towards what the JIT has to get right: stores into
+    the program itself, short loops that a frame's budget cuts part way
+    through, and the platform's extended opcodes.
+    """
+    rom = bytearray()
+    while len(rom) < size:
+        address = 0x200 + len(rom)
+        roll = rng.random()
+        if roll < 0.1:
+            # Point I at the code, then store over it.
+            rom += bytes([0xA2 | rng.randrange(2), rng.getrandbits(8)])
+            rom += bytes([0xF0 | rng.randrange(16), rng.choice((0x33, 0x55))])
+        elif roll < 0.2:
+            # Jump a few instructions back.
+            target = max(0x200, address - 2 * rng.randrange(1, 8))
+            rom += bytes([0x10 | target >> 8, target & 0xFF])
+        elif roll < 0.3 and EXTENDED[platform]:
+            pattern = rng.choice(EXTENDED[platform])
+            rom += bytes.fromhex(pattern % tuple(rng.randrange(16) for _ in range(pattern.count("%x"))))
+        elif roll < 0.35:
+            rom += bytes([0xD0 | rng.randrange(16), rng.getrandbits(8)])
+        else:
+            high = rng.getrandbits(8)
+            if high >> 4 in (0x0, 0x2, 0xB):
+                # Calls, returns and computed jumps mostly run off into
+                # uninteresting places; load a register instead.
+                high = 0x60 | (high & 0xF)
+            rom += bytes([high, rng.getrandbits(8)])
+    return bytes(rom[:size])
+
+
+def run(engine, machine, rng, frames):
+    """Frames with random keys; returns the state after each, or the error."""
+    states = []
+    try:
+        for _ in range(frames):
+            machine.keys = rng.choice([0, 1 << rng.randrange(16)])
+            engine.frame()
+            states.append(machine.save_state())
+    except (IndexError, ValueError, OverflowError) as error:
+        states.append(type(error))
+    return states
+
+
+@pytest.mark.parametrize("ipf", [1, 7, 13, 64])
+@pytest.mark.parametrize("quirks", sorted(PROFILES))
+def test_blocks_match_the_interpreter(quirks, ipf):
+    platform = PROFILES[quirks].platform
+    for seed in range(25):
+        rom = random_rom(random.Random(seed), platform)
+        interpreter = Chip8(rom, ipf=ipf, seed=seed, quirks=quirks)
+        cache = BlockCache(Chip8(rom, ipf=ipf, seed=seed, quirks=quirks))
+        expected = run(interpreter, interpreter, random.Random(seed), 30)
+        assert run(cache, cache.machine, random.Random(seed), 30) == expected, (quirks, ipf, seed)
+
+
+def test_a_loop_cut_short_leaves_pc_inside_it():
+    # V0 += 1; V1 += 2; V2 += 3; jump back: 4 instructions a turn.
+    rom = bytes.fromhex("7001 7102 7203 1200")
+    for ipf in range(1, 12):
+        interpreter = Chip8(rom, ipf=ipf)
+        cache = BlockCache(Chip8(rom, ipf=ipf))
+        for _ in range(10):
+            interpreter.frame()
+            cache.frame()
+            assert cache.machine.pc == interpreter.pc
+            assert cache.machine.v == interpreter.v
+
+
+def test_code_rewritten_by_a_store_is_retranslated():
+    # Overwrite the 6005 at 0x208 with 6007 through Fx55, then run it.
+    rom = bytes.fromhex("6060 6107 a208 f155 6005 1208")
+    cache = BlockCache(Chip8(rom, ipf=3))
+    cache.compile(0x208)
+    for _ in range(4):
+        cache.frame()
+    assert cache.machine.v[0] == 7
+    assert cache.invalidations
+
+
+def test_clear_after_reset_runs_the_new_state():
+    rom = random_rom(random.Random(3), "chip8")
+    reference = Chip8(rom, ipf=9, seed=3)
+    cache = BlockCache(Chip8(rom, ipf=9, seed=3))
+    for _ in range(5):
+        cache.frame()
+    cache.machine.reset()
+    cache.machine.load_rom(rom)
+    cache.clear()
+    for _ in range(10):
+        reference.frame()
+        cache.frame()
+    assert cache.machine.save_state() == reference.save_state()
+    assert cache.machine.table.factory == cache._decode
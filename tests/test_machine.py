@@ -0,0 +1,113 @@
+import pytest
+
+from pychip8 import BlockCache, Chip8
+from pychip8.quirks import PROFILES
+
+CHIP8_PROFILES = [name for name, quirks in PROFILES.items() if quirks.platform == "chip8"]
+
+
+def run_frames(machine, frames, step):
+    """Run `frames` frames, stepping through them or calling frame()."""
+    for _ in range(frames):
+        if step:
+            for _ in range(machine.ipf):
+                machine.step()
+        else:
+            machine.frame()
+
+
+@pytest.mark.parametrize("quirks", CHIP8_PROFILES)
+def test_steps_add_up_to_frames(quirks, random_rom, outcome):
+    # Draws waiting on the display and delay-timer loops need step() to
+    # see the vertical blank and tick the timers like frame() does.
+    for seed in range(40):
+        rom = random_rom(seed)
+        framed = Chip8(rom, ipf=7, seed=seed, quirks=quirks)
+        stepped = Chip8(rom, ipf=7, seed=seed, quirks=quirks)
+        expected = outcome(framed.frame, framed.save_state, 20)
+        assert outcome(lambda: run_frames(stepped, 1, step=True), stepped.save_state, 20) == expected, seed
+
+
+def test_stepping_a_display_wait_draws_on_the_next_frame():
+    # V0 = 0; draw the 0 glyph; loop.
+    machine = Chip8(bytes.fromhex("6000 f029 d015 1206"), ipf=4, quirks="legacy")
+    for _ in range(8):
+        machine.step()
+    assert machine.pc == 0x206
+    assert any(machine.screen.rows)
+
+
+def test_stepping_ticks_the_delay_timer():
+    # DT = 3, then spin until it reads 0.
+    machine = Chip8(bytes.fromhex("6003 f015 f107 3100 1204 120a"), ipf=5)
+    for _ in range(30):
+        machine.step()
+    assert machine.delay_timer == 0
+    assert machine.pc == 0x20A
+
+
+@pytest.mark.parametrize("jit", [False, True])
+def test_frame_finishes_a_part_stepped_frame(jit, random_rom):
+    rom = random_rom(7)
+    reference = Chip8(rom, ipf=9, seed=1)
+    machine = Chip8(rom, ipf=9, seed=1)
+    engine = BlockCache(machine) if jit else machine
+    run_frames(reference, 6, step=False)
+    engine.run(4)
+    engine.frame()
+    engine.run(9 * 5 - 2)
+    engine.run(2)
+    assert machine.frame_cycle == 0
+    assert machine.save_state() == reference.save_state()
+
+
+@pytest.mark.parametrize("jit", [False, True])
+@pytest.mark.parametrize(
+    "rom",
+    [
+        "affe f355 1204",  # Store V0-V3 at 0xFFE.
+        "affe f365 1204",  # Load V0-V3 from 0xFFE.
+        "60ff afff f01e f355 f365 120a",  # I past the end of memory.
+        "60fe afff f033 120a",  # BCD of 254 at 0xFFF.
+    ],
+)
+def test_stores_and_loads_wrap_at_the_end_of_memory(jit, rom):
+    machine = Chip8(bytes.fromhex(rom), quirks="modern")
+    machine.v[:4] = b"\x01\x02\x03\x04"
+    engine = BlockCache(machine) if jit else machine
+    engine.run(40)
+    assert len(machine.memory) == 4096
+    assert len(machine.v) == 16
+    if rom.startswith("affe f355"):
+        assert machine.memory[0xFFE:] == b"\x01\x02"
+        assert machine.memory[:2] == b"\x03\x04"
+    if "f033" in rom:
+        assert machine.memory[0xFFF] == 2
+        assert machine.memory[:2] == b"\x05\x04"
+
+
+@pytest.mark.parametrize("jit", [False, True])
+def test_xochip_ranges_wrap_at_the_end_of_memory(jit):
+    # I = FFFE; store V0-V3; load V3-V0; load the audio pattern.
+    machine = Chip8(bytes.fromhex("f000 fffe 5032 5303 f002 120a"), quirks="xochip")
+    machine.v[:4] = b"\x01\x02\x03\x04"
+    engine = BlockCache(machine) if jit else machine
+    engine.run(40)
+    assert len(machine.memory) == 0x10000
+    assert len(machine.v) == 16
+    assert len(machine.pattern) == 16
+    assert machine.memory[0xFFFE:] + machine.memory[:2] == b"\x01\x02\x03\x04"
+    assert machine.v[:4] == b"\x04\x03\x02\x01"
+
+
+@pytest.mark.parametrize("jit", [False, True])
+def test_a_return_with_an_empty_stack_can_be_saved(jit):
+    # Return, then loop; the stack's top entry points at the loop.
+    machine = Chip8(bytes.fromhex("00ee 1202"))
+    machine.stack[15] = 0x202
+    engine = BlockCache(machine) if jit else machine
+    engine.run(20)
+    assert (machine.sp, machine.pc) == (15, 0x202)
+    restored = Chip8()
+    restored.load_state(machine.save_state())
+    assert restored.save_state() == machine.save_state()